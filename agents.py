@@ -3,6 +3,7 @@ from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
 from config import get_settings, Settings
+from http_client import get_http_client
 from httpx import AsyncClient
 from dataclasses import dataclass
 from enum import Enum
@@ -22,7 +23,7 @@ class Deps:
     user_id: str | None = None
 
 def get_deps(agent_id:str, user_id:str) -> Deps:
-    return Deps(client=AsyncClient(), agent_id=agent_id, user_id=user_id)
+    return Deps(client=get_http_client(), agent_id=agent_id, user_id=user_id)
 
 # https://ai.google.dev/gemini-api/docs/models
 class GeminiModelName(Enum):
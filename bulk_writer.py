@@ -0,0 +1,136 @@
+import asyncio
+import json
+from typing import Iterable, Optional
+
+import db
+from config import get_settings
+from job_queue import current_progress
+
+
+settings = get_settings()
+
+
+class BulkWriter:
+    """
+    Buffers rows and inserts them in chunks bounded by row count and serialized
+    size, with a bounded number of chunks in flight. A failed chunk is retried on
+    its own so one bad request does not lose the rest of the scrape.
+
+    Usage:
+        async with BulkWriter() as writer:
+            await writer.add(rows)
+        writer.report()
+    """
+
+    def __init__(
+        self,
+        table: str = "raw_product_scrapes",
+        chunk_rows: Optional[int] = None,
+        chunk_bytes: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        retries: Optional[int] = None,
+    ):
+        self.table = table
+        self.chunk_rows = chunk_rows or settings.INSERT_CHUNK_ROWS
+        self.chunk_bytes = chunk_bytes or settings.INSERT_CHUNK_BYTES
+        self.retries = settings.INSERT_RETRIES if retries is None else retries
+        self._semaphore = asyncio.Semaphore(concurrency or settings.INSERT_CONCURRENCY)
+        self._tasks: set[asyncio.Task] = set()
+        self._buffer: list[dict] = []
+        self._buffer_bytes = 0
+        self.chunks_sent = 0
+        self.rows_written: dict[str, int] = {}
+        self.rows_failed: dict[str, int] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    async def add(self, rows: Iterable[dict]):
+        """Buffers rows, sending a chunk whenever the row or byte budget is reached."""
+        for row in rows:
+            row_bytes = len(json.dumps(row, default=str))
+            if self._buffer and (
+                len(self._buffer) >= self.chunk_rows
+                or self._buffer_bytes + row_bytes > self.chunk_bytes
+            ):
+                await self._dispatch()
+            self._buffer.append(row)
+            self._buffer_bytes += row_bytes
+
+    async def flush(self) -> dict:
+        """Sends any buffered rows and waits for every in-flight chunk."""
+        if self._buffer:
+            await self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        return self.report()
+
+    async def _dispatch(self):
+        chunk = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        # waiting for a free slot here gives producers natural backpressure
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._send(chunk))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, chunk: list[dict]):
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    await db.insert(self.table, chunk)
+                    self._count(self.rows_written, chunk)
+                    self._report_progress(rows_written=len(chunk))
+                    return
+                except Exception as e:
+                    if attempt == self.retries:
+                        print(
+                            f"Insert of {len(chunk)} rows into {self.table} failed after {attempt + 1} attempts: {e}"
+                        )
+                        self._count(self.rows_failed, chunk)
+                        self._report_progress(rows_failed=len(chunk))
+                        return
+                    await asyncio.sleep(settings.INSERT_RETRY_BACKOFF_S * (2**attempt))
+        finally:
+            self.chunks_sent += 1
+            self._semaphore.release()
+
+    @staticmethod
+    def _count(counter: dict[str, int], chunk: list[dict]):
+        for row in chunk:
+            instance = str(row.get("scrape_instance"))
+            counter[instance] = counter.get(instance, 0) + 1
+
+    @staticmethod
+    def _report_progress(rows_written: int = 0, rows_failed: int = 0):
+        # chunk tasks inherit the queued scrape's progress from the job that created them
+        progress = current_progress()
+        if progress is not None:
+            progress.rows_written += rows_written
+            progress.rows_failed += rows_failed
+
+    def report(self) -> dict:
+        """Rows written and failed, in total and per scrape_instance."""
+        instances = set(self.rows_written) | set(self.rows_failed)
+        return {
+            "rows_written": sum(self.rows_written.values()),
+            "rows_failed": sum(self.rows_failed.values()),
+            "chunks": self.chunks_sent,
+            "by_scrape_instance": {
+                instance: {
+                    "rows_written": self.rows_written.get(instance, 0),
+                    "rows_failed": self.rows_failed.get(instance, 0),
+                }
+                for instance in instances
+            },
+        }
+
+
+async def bulk_insert(rows: Iterable[dict], table: str = "raw_product_scrapes") -> dict:
+    async with BulkWriter(table=table) as writer:
+        await writer.add(rows)
+    return writer.report()
@@ -17,6 +17,57 @@ class Settings(BaseSettings):
     COMPA_PRIVATE_KEY:str
     COMPA_SUPABASE_ID:str
     GEMINI_API_KEY:str
+    # scrape scheduler: max concurrent jobs per supplier, overridable per supplier
+    # e.g. SCRAPE_SUPPLIER_CONCURRENCY='{"foxway": 2}'
+    SCRAPE_DEFAULT_CONCURRENCY:int = 3
+    SCRAPE_SUPPLIER_CONCURRENCY:dict[str, int] = {}
+    # background scrape queue: triggers run concurrently, finished jobs kept for /scrape_jobs
+    SCRAPE_QUEUE_WORKERS:int = 2
+    SCRAPE_QUEUE_HISTORY:int = 200
+    # shared HTTP connection pool used by the supplier fetchers
+    HTTP_TIMEOUT_S:float = 60.0
+    HTTP_CONNECT_TIMEOUT_S:float = 10.0
+    HTTP_MAX_CONNECTIONS:int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS:int = 20
+    HTTP_KEEPALIVE_EXPIRY_S:float = 30.0
+    HTTP_MAX_CONNECTIONS_PER_HOST:int = 6
+    HTTP_MAX_RETRIES:int = 3
+    HTTP_BACKOFF_BASE_S:float = 0.5
+    HTTP_BACKOFF_MAX_S:float = 10.0
+    # worker processes for CPU-heavy parsing (e.g. the Komsa Excel sheet)
+    PARSE_WORKERS:int = 2
+    # bulk inserts into raw_product_scrapes
+    INSERT_CHUNK_ROWS:int = 500
+    INSERT_CHUNK_BYTES:int = 2_000_000
+    INSERT_CONCURRENCY:int = 4
+    INSERT_RETRIES:int = 3
+    INSERT_RETRY_BACKOFF_S:float = 1.0
+    # streaming scrape pipeline: rows normalized per batch and batches fetched ahead
+    PIPELINE_BATCH_ROWS:int = 500
+    PIPELINE_PREFETCH:int = 2
+    # delta scrapes: store only offers whose price/stock changed since the previous
+    # run, starting a new full base after SCRAPE_DELTA_MAX_CHAIN deltas
+    SCRAPE_DELTA_MODE:bool = False
+    SCRAPE_DELTA_MAX_CHAIN:int = 24
+    # raw supplier items are stored once per distinct content in scrape_payloads;
+    # this many recent hashes are remembered so repeats are not re-sent
+    PAYLOAD_KNOWN_HASHES:int = 100_000
+    # price history: local Parquet archive of offer prices and /prices/history range limits
+    PRICE_ARCHIVE_PATH:str = "cache/price_history"
+    PRICE_HISTORY_DEFAULT_DAYS:int = 30
+    PRICE_HISTORY_MAX_DAYS:int = 366
+    # on-disk device exports (CSV / Parquet / Arrow) per scrape_instance, lookup
+    # table version and format, least recently used evicted past the byte budget
+    EXPORT_CACHE_PATH:str = "cache/exports"
+    EXPORT_CACHE_MAX_BYTES:int = 2_000_000_000
+    # batched log shipping to the logs table
+    LOG_QUEUE_MAX:int = 10_000
+    LOG_BATCH_SIZE:int = 200
+    LOG_FLUSH_INTERVAL_S:float = 2.0
+    LOG_SPILL_PATH:str = "cache/log_spill.jsonl"
+    # SKU model-code lookup table cache
+    SKU_LOOKUP_TTL_S:float = 900.0
+    SKU_LOOKUP_CACHE_PATH:str = "cache/sku_lookup_table.json"
     
     class Config:
         env_file = ".env"
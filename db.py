@@ -0,0 +1,130 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+from postgrest.types import ReturnMethod
+from supabase import AsyncClient, acreate_client
+
+from config import get_settings
+
+
+settings = get_settings()
+
+_client: Optional[AsyncClient] = None
+_client_lock = asyncio.Lock()
+
+
+async def get_db() -> AsyncClient:
+    """Returns the long-lived async Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                _client = await acreate_client(
+                    settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY
+                )
+    return _client
+
+
+async def close_db():
+    global _client
+    if _client is not None and _client._postgrest is not None:
+        await _client._postgrest.aclose()
+    _client = None
+
+
+def _apply_filters(query, filters: Optional[dict]):
+    for column, value in (filters or {}).items():
+        query = query.eq(column, value)
+    return query
+
+
+async def insert(table: str, rows: dict | list[dict]) -> list[dict]:
+    if isinstance(rows, list) and not rows:
+        return []
+    client = await get_db()
+    response = await client.table(table).insert(rows).execute()
+    return response.data
+
+
+async def upsert(
+    table: str,
+    rows: list[dict],
+    on_conflict: str,
+    ignore_duplicates: bool = False,
+) -> None:
+    """Inserts rows, skipping (or merging) those that clash on ``on_conflict``."""
+    if not rows:
+        return
+    client = await get_db()
+    await client.table(table).upsert(
+        rows,
+        on_conflict=on_conflict,
+        ignore_duplicates=ignore_duplicates,
+        returning=ReturnMethod.minimal,
+    ).execute()
+
+
+async def update(table: str, values: dict, filters: dict) -> list[dict]:
+    """Updates the rows matching the equality ``filters``."""
+    client = await get_db()
+    query = _apply_filters(client.table(table).update(values), filters)
+    response = await query.execute()
+    return response.data
+
+
+async def select(
+    table: str,
+    columns: str = "*",
+    filters: Optional[dict] = None,
+    order_by: Optional[str] = None,
+    desc: bool = False,
+    limit: Optional[int] = None,
+    between: Optional[dict[str, tuple]] = None,
+) -> list[dict]:
+    """
+    Selects rows matching the equality ``filters`` and, for each column in
+    ``between``, lying within its inclusive (low, high) bounds.
+    """
+    client = await get_db()
+    query = _apply_filters(client.table(table).select(columns), filters)
+    for column, (low, high) in (between or {}).items():
+        query = query.gte(column, low).lte(column, high)
+    if order_by:
+        query = query.order(order_by, desc=desc)
+    if limit is not None:
+        query = query.limit(limit)
+    response = await query.execute()
+    return response.data
+
+
+async def paginate(
+    table: str,
+    columns: str = "*",
+    filters: Optional[dict] = None,
+    page_size: int = 1000,
+    key: str = "scrape_id",
+) -> AsyncIterator[list[dict]]:
+    """
+    Yields pages of rows matching ``filters`` using keyset pagination: rows are
+    ordered by the unique ``key`` column and each page starts after the last
+    key seen, so every page is an index range scan and no row is skipped or
+    repeated. ``key`` is added to the selected columns if missing.
+    """
+    client = await get_db()
+    selected = [column.strip() for column in columns.split(",")]
+    if "*" not in selected and key not in selected:
+        selected.append(key)
+    last_key = None
+    while True:
+        query = _apply_filters(client.table(table).select(", ".join(selected)), filters)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+        response = await query.order(key).limit(page_size).execute()
+        if not response.data:
+            break
+        yield response.data
+        if len(response.data) < page_size:
+            # Last page fetched
+            break
+        last_key = response.data[-1][key]
+
@@ -0,0 +1,295 @@
+import asyncio
+import csv
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import get_settings
+from sku import SkuEngine
+
+
+settings = get_settings()
+
+# columns of every device export, in order; SKU is generated from the others
+EXPORT_COLUMNS = [
+    "make",
+    "model",
+    "storage_capacity",
+    "grade",
+    "purchase_price",
+    "stock_count",
+    "colour",
+    "ce_mark",
+    "partial_vat",
+    "SKU",
+]
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("make", pa.string()),
+        ("model", pa.string()),
+        ("storage_capacity", pa.string()),
+        ("grade", pa.string()),
+        ("purchase_price", pa.float64()),
+        ("stock_count", pa.int64()),
+        ("colour", pa.string()),
+        ("ce_mark", pa.bool_()),
+        ("partial_vat", pa.bool_()),
+        ("SKU", pa.string()),
+    ]
+)
+# format -> (file suffix, media type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+}
+
+
+def _number(value, cast):
+    return None if value is None else cast(value)
+
+
+def devices_table(devices: list[dict], sku_engine: SkuEngine) -> pa.Table:
+    """Device rows as an Arrow table in EXPORT_SCHEMA, with the SKU column filled in."""
+    columns = {
+        name: [device.get(name) for device in devices] for name in EXPORT_COLUMNS[:-1]
+    }
+    # PostgREST returns numeric columns as numbers or strings depending on the value
+    columns["purchase_price"] = [_number(value, float) for value in columns["purchase_price"]]
+    columns["stock_count"] = [_number(value, int) for value in columns["stock_count"]]
+    columns["SKU"] = sku_engine.generate_many(devices)
+    return pa.Table.from_pydict(columns, schema=EXPORT_SCHEMA)
+
+
+def render_devices_csv(devices: list[dict], sku_engine: SkuEngine, header: bool = True) -> str:
+    """Renders device rows as CSV text with a SKU column."""
+    # object dtype keeps values formatted exactly as csv.writer would (e.g. ints stay ints)
+    frame = pd.DataFrame(devices, columns=EXPORT_COLUMNS[:-1], dtype=object)
+    # pages are already row dicts and repeat the same devices, so the memoized
+    # per-row path beats generate_frame here (scripts/benchmark_sku.py)
+    frame["SKU"] = sku_engine.generate_many(devices)
+    return frame.to_csv(index=False, header=header, lineterminator="\r\n")
+
+
+def write_export(devices: list[dict], sku_engine: SkuEngine, path: Path, format: str):
+    if format == "csv":
+        path.write_text(render_devices_csv(devices, sku_engine), newline="")
+        return
+    table = devices_table(devices, sku_engine)
+    if format == "parquet":
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def combined_key(instances: dict[str, str]) -> str:
+    """Cache key of a multi-source export: the scrape_instance of every source in it."""
+    parts = "\x1f".join(f"{source}={instance}" for source, instance in sorted(instances.items()))
+    return "all-" + hashlib.blake2b(parts.encode(), digest_size=8).hexdigest()
+
+
+def write_combined(parts: list[tuple[str, Path]], path: Path, format: str):
+    """
+    Joins per-source exports into one file with a leading ``source`` column.
+    CSV rows are copied through as they are; columnar parts are concatenated
+    as Arrow tables.
+    """
+    if format == "csv":
+        with open(path, "w", newline="") as out:
+            writer = csv.writer(out, lineterminator="\r\n")
+            writer.writerow(["source", *EXPORT_COLUMNS])
+            for source, part in parts:
+                with open(part, newline="") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)  # each part has its own header
+                    writer.writerows([source, *row] for row in reader)
+        return
+
+    tables = []
+    for source, part in parts:
+        if format == "parquet":
+            table = pq.read_table(part)
+        else:
+            with pa.ipc.open_stream(part) as reader:
+                table = reader.read_all()
+        tables.append(table.add_column(0, "source", pa.array([source] * table.num_rows, pa.string())))
+    table = (
+        pa.concat_tables(tables)
+        if tables
+        else EXPORT_SCHEMA.insert(0, pa.field("source", pa.string())).empty_table()
+    )
+    if format == "parquet":
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+class PendingExport:
+    """
+    An export file being written alongside a streamed response. It only
+    joins the cache on ``commit``; an aborted download leaves nothing behind.
+    """
+
+    def __init__(self, cache: "ExportCache", path: Path):
+        self.cache = cache
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # unique per writer, as two cold downloads of one export can overlap
+        handle, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        self.tmp_path = Path(tmp_name)
+        self._file = os.fdopen(handle, "wb")
+
+    def write(self, data: str | bytes):
+        self._file.write(data.encode() if isinstance(data, str) else data)
+
+    def commit(self):
+        self._file.close()
+        self.tmp_path.replace(self.path)
+        self.cache.added(self.path)
+
+    def abort(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ExportCache:
+    """
+    Device exports on disk, keyed by scrape_instance, lookup table version
+    and format. A completed scrape never changes, so each file is built once
+    and every later download is a static file send (or a 304 when the
+    client's ETag still matches).
+
+    Files are evicted least recently used first once they take more than
+    ``max_bytes``; every hit marks a file as used (also on disk, via its
+    mtime, so the order survives restarts).
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or settings.EXPORT_CACHE_PATH)
+        self.max_bytes = settings.EXPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._building: dict[str, asyncio.Task] = {}
+        self._entries: Optional[OrderedDict[str, int]] = None  # file name -> size, oldest first
+
+    @staticmethod
+    def etag(scrape_instance: str, version: Optional[str], format: str) -> str:
+        return f'"{scrape_instance}-{version or "none"}-{format}"'
+
+    def export_path(self, scrape_instance: str, version: Optional[str], format: str) -> Path:
+        suffix, _ = EXPORT_FORMATS[format]
+        return self.path / f"devices_{scrape_instance}_{version or 'none'}{suffix}"
+
+    @staticmethod
+    def tmp_path(path: Path) -> Path:
+        # dot-prefixed until complete, so a concurrent reader never sees half a file
+        return path.with_name(f".{path.name}.tmp")
+
+    def lookup(self, scrape_instance: str, version: Optional[str], format: str) -> Optional[Path]:
+        """The cached file for this key, marked as recently used, or None."""
+        path = self.export_path(scrape_instance, version, format)
+        if not path.exists():
+            return None
+        entries = self._load_entries()
+        if path.name in entries:
+            entries.move_to_end(path.name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    async def get(
+        self,
+        scrape_instance: str,
+        version: Optional[str],
+        format: str,
+        load: Callable[[], Awaitable[list[dict]]],
+        sku_engine: SkuEngine,
+    ) -> Path:
+        """Path of the export, building it from ``load``'s devices if it is not cached."""
+
+        async def write(tmp_path: Path):
+            devices = await load()
+            await asyncio.to_thread(write_export, devices, sku_engine, tmp_path, format)
+
+        return await self.get_or_build(scrape_instance, version, format, write)
+
+    async def get_or_build(
+        self,
+        scrape_instance: str,
+        version: Optional[str],
+        format: str,
+        write: Callable[[Path], Awaitable[None]],
+    ) -> Path:
+        """Path of the cached file for this key, produced by ``write(tmp_path)`` on a miss."""
+        path = self.lookup(scrape_instance, version, format)
+        if path is not None:
+            return path
+        path = self.export_path(scrape_instance, version, format)
+        # concurrent downloads of a new export share one build
+        key = path.name
+        if key not in self._building:
+            self._building[key] = asyncio.create_task(self._build(path, write))
+            self._building[key].add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(self._building[key])
+
+    def open_for_write(self, scrape_instance: str, version: Optional[str], format: str) -> PendingExport:
+        return PendingExport(self, self.export_path(scrape_instance, version, format))
+
+    async def _build(self, path: Path, write: Callable[[Path], Awaitable[None]]) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_path(path)
+        try:
+            await write(tmp_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(path)
+        self.added(path)
+        return path
+
+    def added(self, path: Path):
+        entries = self._load_entries()
+        entries[path.name] = path.stat().st_size
+        entries.move_to_end(path.name)
+        self._evict(keep=path.name)
+
+    def _load_entries(self) -> OrderedDict[str, int]:
+        if self._entries is None:
+            files = []
+            if self.path.exists():
+                for file in self.path.iterdir():
+                    if file.is_file() and not file.name.startswith("."):
+                        stat = file.stat()
+                        files.append((stat.st_mtime, file.name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        return self._entries
+
+    def _evict(self, keep: str):
+        entries = self._load_entries()
+        total = sum(entries.values())
+        for name in list(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= entries.pop(name)
+            try:
+                (self.path / name).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not evict cached export {name}: {e}")
+
+
+export_cache = ExportCache()
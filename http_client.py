@@ -0,0 +1,107 @@
+import asyncio
+import random
+from typing import Optional
+
+import httpx
+
+from config import get_settings
+
+
+settings = get_settings()
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Builds the keep-alive connection pool shared by every supplier fetcher."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.HTTP_TIMEOUT_S, connect=settings.HTTP_CONNECT_TIMEOUT_S
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+        follow_redirects=True,
+    )
+
+
+async def start_http_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _host_semaphores.clear()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the application-lifetime client, creating it if startup has not run (e.g. scripts)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = httpx.URL(url).host
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(
+            settings.HTTP_MAX_CONNECTIONS_PER_HOST
+        )
+    return _host_semaphores[host]
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            # never let a server park a scrape job for longer than our own backoff cap
+            return min(float(retry_after), settings.HTTP_BACKOFF_MAX_S)
+    backoff = settings.HTTP_BACKOFF_BASE_S * (2**attempt)
+    return min(backoff, settings.HTTP_BACKOFF_MAX_S) + random.uniform(0, 0.1 * backoff)
+
+
+async def request_with_retry(
+    method: str,
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Sends a request through the shared pool, capping in-flight requests per host
+    and retrying transport errors and retryable status codes with exponential backoff.
+    The final response is returned as-is, callers decide whether to raise_for_status.
+    """
+    client = client or get_http_client()
+    semaphore = _host_semaphore(url)
+    max_retries = settings.HTTP_MAX_RETRIES
+
+    for attempt in range(max_retries + 1):
+        response = None
+        try:
+            async with semaphore:
+                response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return response
+        except httpx.TransportError as e:
+            if attempt == max_retries:
+                raise
+            print(f"Request to {url} failed ({e!r}), retrying")
+        await asyncio.sleep(_retry_delay(attempt, response))
+
+    raise RuntimeError("unreachable")  # the loop always returns or raises
+
+
+async def http_get(url: str, client: Optional[httpx.AsyncClient] = None, **kwargs):
+    return await request_with_retry("GET", url, client=client, **kwargs)
@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import dataclasses
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable, Optional
+
+from config import get_settings
+from scheduler import ScrapeJob
+from scrape_runs import RUN_COMPLETED
+
+
+settings = get_settings()
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class ScrapeProgress:
+    """Live counters for one scrape_instance, bumped by the pipeline and bulk writer."""
+
+    pages_fetched: int = 0
+    rows_normalized: int = 0
+    rows_written: int = 0
+    rows_failed: int = 0
+
+
+_current_progress: contextvars.ContextVar[Optional[ScrapeProgress]] = (
+    contextvars.ContextVar("scrape_progress", default=None)
+)
+
+
+def current_progress() -> Optional[ScrapeProgress]:
+    """Progress of the scrape running in this task, or None outside a queued scrape."""
+    return _current_progress.get()
+
+
+async def _run_with_progress(progress: ScrapeProgress, run: Callable[[], Awaitable[Any]]):
+    # tasks started by the job (fetch producer, insert chunks) inherit the context
+    _current_progress.set(progress)
+    return await run()
+
+
+@dataclass
+class QueuedScrape:
+    """One triggered scrape: the jobs it runs, its status and per-instance progress."""
+
+    id: str
+    jobs: list[ScrapeJob]
+    caller: Optional[str] = None
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: dict[str, ScrapeProgress] = field(default_factory=dict)
+    summary: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def suppliers(self) -> set[str]:
+        return {job.supplier for job in self.jobs}
+
+    @property
+    def active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "caller": self.caller,
+            "suppliers": sorted(self.suppliers),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "scrape_instances": {
+                instance: {
+                    "supplier": next(
+                        job.supplier for job in self.jobs if job.scrape_instance == instance
+                    ),
+                    **dataclasses.asdict(progress),
+                }
+                for instance, progress in self.progress.items()
+            },
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+class ScrapeJobQueue:
+    """
+    Runs triggered scrapes on a small pool of local workers so the scrape
+    endpoints can return straight away.
+
+    ``submit`` skips any supplier that already has a queued or running scrape,
+    so overlapping triggers never scrape the same supplier twice. Finished
+    scrapes are kept (up to ``history``) for the status endpoint.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[list[ScrapeJob]], Awaitable[dict]],
+        workers: Optional[int] = None,
+        history: Optional[int] = None,
+        on_finish: Optional[Callable[[QueuedScrape], None]] = None,
+    ):
+        self.run = run
+        self.workers = workers or settings.SCRAPE_QUEUE_WORKERS
+        self.history = history or settings.SCRAPE_QUEUE_HISTORY
+        self.on_finish = on_finish
+        self._queue: asyncio.Queue[QueuedScrape] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._scrapes: OrderedDict[str, QueuedScrape] = OrderedDict()
+        self._by_instance: dict[str, str] = {}
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        """Cancels the workers; interrupted scrape runs are marked failed by ``run``."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for scrape in self._scrapes.values():
+            if scrape.active:
+                self._finish(scrape, JOB_FAILED, error="Service shut down")
+
+    def submit(self, jobs: list[ScrapeJob], caller: Optional[str] = None) -> dict:
+        """
+        Queues ``jobs`` as one scrape and returns its id and scrape_instances.
+        Jobs for suppliers that are already queued or running are dropped and
+        reported under ``deduplicated``.
+        """
+        busy = {
+            supplier: scrape.id
+            for scrape in self._scrapes.values()
+            if scrape.active
+            for supplier in scrape.suppliers
+        }
+        deduplicated = {
+            job.supplier: busy[job.supplier] for job in jobs if job.supplier in busy
+        }
+        jobs = [job for job in jobs if job.supplier not in busy]
+        if not jobs:
+            return {"job_id": None, "scrape_instances": [], "deduplicated": deduplicated}
+
+        scrape = QueuedScrape(id=str(uuid.uuid4()), jobs=jobs, caller=caller)
+        for job in jobs:
+            scrape.progress.setdefault(job.scrape_instance, ScrapeProgress())
+            self._by_instance[job.scrape_instance] = scrape.id
+        self._scrapes[scrape.id] = scrape
+        self._trim_history()
+        self._queue.put_nowait(scrape)
+        return {
+            "job_id": scrape.id,
+            "scrape_instances": list(scrape.progress),
+            "deduplicated": deduplicated,
+        }
+
+    def get(self, job_id: str) -> Optional[QueuedScrape]:
+        """Looks a scrape up by its job id or by any of its scrape_instances."""
+        scrape = self._scrapes.get(job_id)
+        if scrape is None and job_id in self._by_instance:
+            scrape = self._scrapes.get(self._by_instance[job_id])
+        return scrape
+
+    async def _worker(self):
+        while True:
+            scrape = await self._queue.get()
+            try:
+                await self._execute(scrape)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, scrape: QueuedScrape):
+        scrape.status = JOB_RUNNING
+        scrape.started_at = time.time()
+        tracked = [
+            dataclasses.replace(
+                job,
+                run=partial(_run_with_progress, scrape.progress[job.scrape_instance], job.run),
+            )
+            for job in scrape.jobs
+        ]
+        try:
+            scrape.summary = await self.run(tracked)
+        except Exception as e:
+            print(f"Scrape job {scrape.id} failed: {e}")
+            self._finish(scrape, JOB_FAILED, error=f"{type(e).__name__}: {e}")
+            return
+        failed = any(
+            entry.get("status") != RUN_COMPLETED for entry in scrape.summary.values()
+        )
+        self._finish(scrape, JOB_FAILED if failed else JOB_COMPLETED)
+
+    def _finish(self, scrape: QueuedScrape, status: str, error: Optional[str] = None):
+        scrape.status = status
+        scrape.error = error
+        scrape.finished_at = time.time()
+        if self.on_finish is not None:
+            try:
+                self.on_finish(scrape)
+            except Exception as e:
+                print(e)
+
+    def _trim_history(self):
+        finished = [scrape for scrape in self._scrapes.values() if not scrape.active]
+        for scrape in finished[: max(len(self._scrapes) - self.history, 0)]:
+            del self._scrapes[scrape.id]
+            for job in scrape.jobs:
+                self._by_instance.pop(job.scrape_instance, None)
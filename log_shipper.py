@@ -0,0 +1,180 @@
+import asyncio
+import json
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import db
+from config import get_settings
+
+
+settings = get_settings()
+
+
+class LogShipper:
+    """
+    Ships rows to the ``logs`` table from an in-memory queue.
+
+    ``submit`` only appends to a bounded deque, so logging from a request costs
+    microseconds. A background task inserts the queue in batches every
+    ``flush_interval_s`` (or sooner once a full batch is waiting). When the queue
+    is full, or a batch insert fails, rows are appended to a local JSON-lines
+    spill file instead; the spill file is replayed on the next start and
+    whenever an insert succeeds again.
+    """
+
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval_s: Optional[float] = None,
+        spill_path: Optional[str] = None,
+    ):
+        self.max_queue = max_queue or settings.LOG_QUEUE_MAX
+        self.batch_size = batch_size or settings.LOG_BATCH_SIZE
+        self.flush_interval_s = flush_interval_s or settings.LOG_FLUSH_INTERVAL_S
+        self.spill_path = Path(spill_path or settings.LOG_SPILL_PATH)
+        self._queue: deque[dict] = deque()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._replay_lock = asyncio.Lock()
+        self.dropped = 0
+        self.spilled = 0
+
+    def submit(self, entry: dict):
+        # round-trip through JSON now so one unserializable context (e.g. a UUID)
+        # cannot fail a whole batch later
+        entry = json.loads(json.dumps(entry, default=str))
+        if len(self._queue) >= self.max_queue:
+            self._spill([entry])
+            return
+        self._queue.append(entry)
+        if len(self._queue) >= self.batch_size:
+            self._batch_ready.set()
+        self._ensure_running()
+
+    def _ensure_running(self):
+        if self._stopping:
+            return
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                # no event loop (e.g. a script); rows wait in the queue for start()
+                pass
+
+    async def start(self):
+        self._stopping = False
+        self._ensure_running()
+        await self._replay_spill()
+
+    async def stop(self):
+        """Stops the flusher and ships whatever is still queued."""
+        self._stopping = True
+        self._batch_ready.set()
+        if self._task is not None:
+            # let an in-flight insert finish rather than cancelling it and
+            # losing the batch it already took off the queue
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            if await self.flush() and self.spill_path.exists():
+                # the database is reachable again, so retry earlier spills
+                await self._replay_spill()
+
+    async def flush(self) -> bool:
+        """
+        Ships the queue in batches. Returns True if at least one batch was
+        inserted and none failed, i.e. the database is known to be reachable.
+        """
+        shipped = False
+        while self._queue:
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self.batch_size, len(self._queue)))
+            ]
+            try:
+                await db.insert("logs", batch)
+            except asyncio.CancelledError:
+                # put the batch back so a later flush (or stop()) still ships it
+                self._queue.extendleft(reversed(batch))
+                raise
+            except Exception as e:
+                print(f"Could not ship {len(batch)} log rows: {e}")
+                self._spill(batch)
+                return False
+            shipped = True
+        return shipped
+
+    def _spill(self, entries: list[dict]):
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+            self.spilled += len(entries)
+        except Exception as e:
+            self.dropped += len(entries)
+            print(f"Dropped {len(entries)} log rows: {e}")
+
+    def _read_spill(self) -> list[dict]:
+        """
+        Moves the spill file onto the end of the replay file and returns every
+        row in it. Lines that do not parse (e.g. one truncated by a crash while
+        spilling) are skipped.
+        """
+        replay_path = self.spill_path.with_suffix(".replay")
+        if self.spill_path.exists():
+            # append, so rows left behind by an interrupted replay are kept
+            text = self.spill_path.read_text()
+            if text and not text.endswith("\n"):
+                text += "\n"
+            with open(replay_path, "a") as f:
+                f.write(text)
+            self.spill_path.unlink()
+        if not replay_path.exists():
+            return []
+        entries = []
+        skipped = 0
+        with open(replay_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    skipped += 1
+        if skipped:
+            self.dropped += skipped
+            print(f"Skipped {skipped} unreadable lines in {replay_path}")
+        return entries
+
+    async def _replay_spill(self):
+        if self._replay_lock.locked():
+            return
+        async with self._replay_lock:
+            try:
+                entries = await asyncio.to_thread(self._read_spill)
+            except Exception as e:
+                print(f"Could not read spilled log rows: {e}")
+                return
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start : start + self.batch_size]
+                try:
+                    await db.insert("logs", batch)
+                except Exception as e:
+                    print(f"Could not replay spilled log rows: {e}")
+                    self._spill(entries[start:])
+                    break
+            self.spill_path.with_suffix(".replay").unlink(missing_ok=True)
+
+log_shipper = LogShipper()
@@ -0,0 +1,144 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from config import get_settings
+from http_client import http_get
+from sku import SkuEngine
+
+
+settings = get_settings()
+
+SKU_LOOKUP_SHEET_ID = "1B1TLvZJoP8TRpJnek7oc_f5j6KvbdCqE4tJ2rqH99Fw"
+SKU_LOOKUP_SHEET_GID = "0"  # e.g., '0' for the first sheet
+
+
+async def fetch_sku_lookup_table() -> Optional[list]:
+    """Downloads the model-code Google Sheet as a list of CSV rows."""
+    export_url = f"https://docs.google.com/spreadsheets/d/{SKU_LOOKUP_SHEET_ID}/export?format=csv&gid={SKU_LOOKUP_SHEET_GID}"
+
+    try:
+        response = await http_get(export_url)
+        response.raise_for_status()  # Raises an exception for HTTP errors
+
+        # parse the str into a list
+        csv_reader = csv.reader(io.StringIO(response.text))
+        return list(csv_reader)
+    except Exception as e:
+        print(e)
+
+
+class LookupTableCache:
+    """
+    In-process cache for the SKU model-code table.
+
+    Fresh entries are served straight from memory. Once the TTL has passed the
+    cached table is still served while a single background refresh fetches a
+    new copy (stale-while-revalidate). Every successful fetch is written to
+    disk so a cold start can serve the last known table without waiting on
+    the sheet.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[Optional[list]]] = fetch_sku_lookup_table,
+        ttl_s: Optional[float] = None,
+        path: Optional[str] = None,
+    ):
+        self.fetch = fetch
+        self.ttl_s = settings.SKU_LOOKUP_TTL_S if ttl_s is None else ttl_s
+        self.path = Path(path or settings.SKU_LOOKUP_CACHE_PATH)
+        self.table: Optional[list] = None
+        self.version: Optional[str] = None
+        self.fetched_at: float = 0.0  # unix time of the fetch that produced the table
+        self._engine: Optional[SkuEngine] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched_at > self.ttl_s
+
+    def _set(self, table: list, fetched_at: float):
+        self.table = table
+        self.fetched_at = fetched_at
+        self.version = hashlib.sha1(
+            json.dumps(table, separators=(",", ":")).encode()
+        ).hexdigest()[:16]
+        self._engine = None
+
+    def load_from_disk(self) -> bool:
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+            self._set(cached["rows"], cached["fetched_at"])
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Could not read cached lookup table {self.path}: {e}")
+            return False
+
+    def _save_to_disk(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"fetched_at": self.fetched_at, "rows": self.table}, f)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"Could not persist lookup table to {self.path}: {e}")
+
+    async def refresh(self) -> bool:
+        """Fetches the sheet now; concurrent callers share the same fetch."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self) -> bool:
+        table = await self.fetch()
+        if not table:
+            # keep serving the previous copy if the sheet is unavailable
+            return False
+        self._set(table, time.time())
+        await asyncio.to_thread(self._save_to_disk)
+        return True
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def warm(self):
+        """Loads the on-disk copy on startup and revalidates it in the background."""
+        if self.table is None:
+            self.load_from_disk()
+        if self.table is None or self.is_stale():
+            self._refresh_in_background()
+
+    async def get(self) -> Optional[list]:
+        if self.table is None and not self.load_from_disk():
+            # nothing cached anywhere yet, so this caller has to wait
+            await self.refresh()
+        elif self.is_stale():
+            self._refresh_in_background()
+        return self.table
+
+    async def get_engine(self) -> Optional[SkuEngine]:
+        """SkuEngine for the current table, rebuilt only when the table changes."""
+        table = await self.get()
+        if table is None:
+            return None
+        if self._engine is None:
+            self._engine = SkuEngine(table)
+        return self._engine
+
+    async def invalidate(self) -> bool:
+        """Drops the cached age and fetches the sheet immediately."""
+        self.fetched_at = 0.0
+        return await self.refresh()
+
+
+lookup_table_cache = LookupTableCache()
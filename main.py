@@ -1,30 +1,88 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, Request
 from fastapi.staticfiles import StaticFiles
-from models import RawProductScrape
+from models import validate_scrape_rows
+import asyncio
 import re
 import httpx
 import json
-from supabase import create_client, Client
 from config import get_settings
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
 import uuid
-from fastapi.responses import StreamingResponse
-import csv
-import io
-import requests
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import pandas as pd
-from io import BytesIO
 from urllib.parse import urlparse, parse_qs
 from enum import Enum
 import datetime
 from ui import router
 from ai_router import router as ai_router
-from maps import sku_colour_map, sku_grade_map, komsa_colour_map
+from maps import komsa_colour_map
+from normalize import (
+    ColourMatcher,
+    UNKNOWN_STORAGE,
+    make_set,
+    parse_storage,
+    split_product_name,
+)
+from lookup_cache import lookup_table_cache
+from log_shipper import log_shipper
+from scheduler import ScrapeJob, ScrapeScheduler, summarise_results
+from job_queue import ScrapeJobQueue, QueuedScrape, JOB_COMPLETED
+from scrape_runs import (
+    start_scrape_run,
+    finish_scrape_run,
+    run_status,
+    get_latest_completed_run,
+    get_scrape_run,
+    RUN_FAILED,
+    RUN_COMPLETED,
+    RUN_MODE_DELTA,
+)
+from offer_delta import (
+    create_offer_tracker,
+    register_tracker,
+    unregister_tracker,
+    load_snapshot,
+)
+from bulk_writer import bulk_insert
+from payloads import payload_store
+from offer_index import SourceOffers, offer_index, price_key
+from price_history import price_history
+from exports import (
+    EXPORT_FORMATS,
+    combined_key,
+    export_cache,
+    render_devices_csv,
+    write_combined,
+)
+from functools import partial
+from contextlib import asynccontextmanager
+from http_client import start_http_client, close_http_client, http_get
+from workers import run_in_process_pool, parse_excel_bytes, shutdown_process_pool
+import db
+from pipeline import run_pipeline, iter_batches, iter_dataframe_slices
 
 
-app = FastAPI()
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_client()
+    await log_shipper.start()
+    await lookup_table_cache.warm()
+    await offer_index.warm({source.value: get_source_id(source) for source in SourceIDEnum})
+    await scrape_job_queue.start()
+    yield
+    await scrape_job_queue.stop()
+    await offer_index.stop()
+    await log_shipper.stop()
+    await db.close_db()
+    await close_http_client()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
 app.include_router(router)
 app.include_router(ai_router)
 app.mount("/templates", StaticFiles(directory="templates"), name="templates")
@@ -37,8 +95,20 @@ class SourceIDEnum(str, Enum):
     dipli = "Dipli"
 
 
-def get_supabase_client() -> Client:
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+class ExportFormat(str, Enum):
+    csv = "csv"
+    parquet = "parquet"
+    arrow = "arrow"  # Arrow IPC stream
+
+
+def get_source_id(source: str) -> Optional[str]:
+    """Supabase source_id for a supplier name such as SourceIDEnum.foxway."""
+    return {
+        "foxway": settings.FOXWAY_SUPABASE_ID,
+        "komsa": settings.KOMSA_SUPABASE_ID,
+        "compa": settings.COMPA_SUPABASE_ID,
+        "dipli": settings.DIPLI_RECYCLE_SUPABASE_ID,
+    }.get(source.lower())
 
 
 def log_to_supabase(
@@ -49,7 +119,6 @@ def log_to_supabase(
     source: Optional[str] = None,
 ):
     try:
-        supabase_client = get_supabase_client()
         log_entry = {
             "log_level": log_level,
             "message": message,
@@ -57,35 +126,29 @@ def log_to_supabase(
             "user_id": user_id,
             "source": source,
         }
-        response = supabase_client.table("logs").insert(log_entry).execute()
-        return response
+        # queued and inserted in batches by the background log shipper
+        log_shipper.submit(log_entry)
     except Exception as e:
         print(e)
 
 
 @app.get("/download/lookup_table", tags=["Download"])
-def get_sku_lookup_table():
-    sheet_id = "1B1TLvZJoP8TRpJnek7oc_f5j6KvbdCqE4tJ2rqH99Fw"
-    sheet_gid = "0"  # e.g., '0' for the first sheet
-
-    export_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={sheet_gid}"
-
-    try:
-        response = requests.get(export_url)
-        response.raise_for_status()  # Raises an exception for HTTP errors
-
-        csv_data_string = response.text
-
-        # parse the str into a list
-        csv_reader = csv.reader(io.StringIO(csv_data_string))
-        csv_list = list(csv_reader)
-
-        return csv_list
-    except Exception as e:
-        print(e)
+async def get_sku_lookup_table():
+    return await lookup_table_cache.get()
+
+
+@app.post("/download/lookup_table/invalidate", tags=["Download"])
+async def invalidate_sku_lookup_table():
+    """Forces the SKU lookup table to be re-downloaded from the Google Sheet."""
+    refreshed = await lookup_table_cache.invalidate()
+    return {
+        "success": refreshed,
+        "version": lookup_table_cache.version,
+        "rows": len(lookup_table_cache.table or []),
+    }
 
 
-def fetch_excel_as_df(excel_url: str) -> pd.DataFrame:
+async def fetch_excel_as_df(excel_url: str) -> pd.DataFrame:
 
     # Check if the URL is an officeapps.live.com viewer link
     if "view.officeapps.live.com" in excel_url:
@@ -104,23 +167,21 @@ def fetch_excel_as_df(excel_url: str) -> pd.DataFrame:
 
     # print(f"Attempting to download and convert data from: {direct_excel_link}")
 
-    # Use requests to get the actual Excel file content
-    response = requests.get(direct_excel_link)
+    # Download the actual Excel file content without blocking the event loop
+    response = await http_get(direct_excel_link)
     response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
 
-    # Use BytesIO to create an in-memory binary stream from the content
-    excel_file_bytes = BytesIO(response.content)
-
-    df = pd.read_excel(excel_file_bytes, engine="openpyxl")
+    # Parsing the workbook is CPU bound, so do it in a worker process
+    df = await run_in_process_pool(parse_excel_bytes, response.content)
     return df
 
 
-def create_db_row(data: RawProductScrape):
-    """Creates a dictionary for a database row from a RawProductScrape model."""
-    row = data.dict()
-    # Ensure storage_capacity is uppercase
-    row["storage_capacity"] = row["storage_capacity"].upper()
-    return row
+def validated_rows(rows: list[dict]) -> list[dict]:
+    """Validates a batch of normalized rows, printing the ones that are dropped."""
+    valid, rejected = validate_scrape_rows(rows)
+    for index, error in rejected:
+        print(f"Error processing row {rows[index]}: {error}")
+    return valid
 
 
 def load_data_from_disk(filename):
@@ -150,7 +211,10 @@ def save_data_to_disk(data, source: str):
 
 
 async def scrape_foxway(
-    manufacturer: str, partial_vat: bool, scrape_instance: Optional[uuid.UUID] = None
+    manufacturer: str,
+    partial_vat: bool,
+    scrape_instance: Optional[uuid.UUID] = None,
+    client: Optional[httpx.AsyncClient] = None,
 ):
 
     # lookup table for manufacturer_id
@@ -178,12 +242,12 @@ async def scrape_foxway(
         "X-ApiKey": settings.FOXWAY_API_KEY,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params, headers=headers)
+    response = await http_get(url, client=client, params=params, headers=headers)
+    response.raise_for_status()
 
     json_data = response.json()
 
-    await write_scrape_to_supabase(
+    return await write_scrape_to_supabase(
         manufacturer, partial_vat, json_data, scrape_instance=scrape_instance
     )
 
@@ -194,12 +258,27 @@ async def write_scrape_to_supabase(
     data: dict,
     scrape_instance: Optional[uuid.UUID] = None,
 ):
+    # normalize and insert the price list in batches rather than all at once
+    return await run_pipeline(
+        iter_batches(data, settings.PIPELINE_BATCH_ROWS),
+        partial(
+            normalize_foxway_rows,
+            manufacturer=manufacturer,
+            partial_vat=partial_vat,
+            scrape_instance=scrape_instance,
+        ),
+    )
 
-    # we know manufactureer id Huawei is 137 and vat margin is False
-    supabase_client = get_supabase_client()
 
-    insert_rows = []
-    for line in data:
+def normalize_foxway_rows(
+    lines: list,
+    manufacturer: str,
+    partial_vat: bool,
+    scrape_instance: Optional[uuid.UUID] = None,
+) -> Iterator[dict]:
+
+    # we know manufactureer id Huawei is 137 and vat margin is False
+    for line in lines:
         # Find the grade value in the Dimension list robustly
         grade = next(
             (
@@ -215,100 +294,219 @@ async def write_scrape_to_supabase(
         else:
             grade = grade.replace("Grade ", "")
 
-        storage = line["ProductName"]
-        if "128GB" in storage:
-            storage = "128GB"
-        elif "64GB" in storage:
-            storage = "64GB"
-        elif "32GB" in storage:
-            storage = "32GB"
-        elif "256GB" in storage:
-            storage = "256GB"
-        elif "512GB" in storage:
-            storage = "512GB"
-        elif "16GB" in storage:
-            storage = "16GB"
-        elif "8GB" in storage:
-            storage = "8GB"
-        elif "4GB" in storage:
-            storage = "4GB"
-        elif "2GB" in storage:
-            storage = "2GB"
-        elif "1TB" in storage:
-            storage = "1TB"
-        elif "2TB" in storage:
-            storage = "2TB"
-        elif "4TB" in storage:
-            storage = "4TB"
-        else:
-            storage = "Unknown Storage"
-
-        model = line["ProductName"]
-        # remove the storage from the model name
-        for size in [
-            "128GB",
-            "64GB",
-            "32GB",
-            "256GB",
-            "512GB",
-            "16GB",
-            "8GB",
-            "4GB",
-            "2GB",
-            "1TB",
-            "2TB",
-            "4TB",
-        ]:
-            model = model.replace(size, "").strip()
-
-        # remove the word "Huawei" from the model name
-        makes = ["Apple", "Samsung", "Huawei"]
-        for make in makes:
-            model = model.replace(make, "").strip()
-
-        insert_rows.append(
-            {
-                "source_id": settings.FOXWAY_SUPABASE_ID,  # Assuming you have a source ID for Foxway
-                "make": manufacturer,
-                "model": model,
-                "storage_capacity": storage,  # This is hardcoded, adjust as needed
-                "grade": grade,  # Assuming this is the grade
-                "colour": line["Dimension"][0]["Value"],
-                "ce_mark": None,
-                "partial_vat": partial_vat,  # Adjust based on your data
-                "purchase_price": line["Price"],
-                "trade_in_price": None,  # Adjust if you have this data
-                "stock_count": line["Quantity"],
-                "meta_data": json.dumps(line),  # Store the entire item as metadata
-                "scrape_instance": (
-                    str(scrape_instance) if scrape_instance else None
-                ),  # Use the provided scrape instance or set to None
-            }
+        storage, model = split_product_name(line["ProductName"], FOXWAY_MAKES)
+
+        yield {
+            "source_id": settings.FOXWAY_SUPABASE_ID,  # Assuming you have a source ID for Foxway
+            "make": manufacturer,
+            "model": model,
+            "storage_capacity": storage,  # This is hardcoded, adjust as needed
+            "grade": grade,  # Assuming this is the grade
+            "colour": line["Dimension"][0]["Value"],
+            "ce_mark": None,
+            "partial_vat": partial_vat,  # Adjust based on your data
+            "purchase_price": line["Price"],
+            "trade_in_price": None,  # Adjust if you have this data
+            "stock_count": line["Quantity"],
+            # the entire item is stored once in scrape_payloads, keyed by this hash
+            "payload_hash": payload_store.add(line, settings.FOXWAY_SUPABASE_ID),
+            "scrape_instance": (
+                str(scrape_instance) if scrape_instance else None
+            ),  # Use the provided scrape instance or set to None
+        }
+
+
+FOXWAY_MANUFACTURERS = ["huawei", "apple", "samsung"]
+# stripped from Foxway product names to leave the model
+FOXWAY_MAKES = make_set(["Apple", "Samsung", "Huawei"])
+FOXWAY_VAT_MODES = [True, False]
+
+
+def create_scrape_scheduler() -> ScrapeScheduler:
+    return ScrapeScheduler(
+        default_concurrency=settings.SCRAPE_DEFAULT_CONCURRENCY,
+        supplier_concurrency=settings.SCRAPE_SUPPLIER_CONCURRENCY,
+    )
+
+
+def foxway_scrape_jobs(scrape_instance: str) -> list[ScrapeJob]:
+    """One job per manufacturer and VAT mode, all sharing the same scrape_instance."""
+    return [
+        ScrapeJob(
+            supplier=SourceIDEnum.foxway.value,
+            name=f"foxway:{manufacturer}:{'partial_vat' if vat else 'full_vat'}",
+            scrape_instance=scrape_instance,
+            run=partial(scrape_foxway, manufacturer, vat, scrape_instance),
         )
+        for manufacturer in FOXWAY_MANUFACTURERS
+        for vat in FOXWAY_VAT_MODES
+    ]
+
+
+def komsa_scrape_job(scrape_instance: str) -> ScrapeJob:
+    return ScrapeJob(
+        supplier=SourceIDEnum.komsa.value,
+        name="komsa",
+        scrape_instance=scrape_instance,
+        run=partial(scrape_komsa_excel, scrape_instance),
+    )
+
+
+def dipli_scrape_job(scrape_instance: str) -> ScrapeJob:
+    return ScrapeJob(
+        supplier=SourceIDEnum.dipli.value,
+        name="dipli",
+        scrape_instance=scrape_instance,
+        run=partial(scrape_dipli, scrape_instance),
+    )
+
+
+def compa_scrape_job(scrape_instance: str) -> ScrapeJob:
+    return ScrapeJob(
+        supplier=SourceIDEnum.compa.value,
+        name="compa",
+        scrape_instance=scrape_instance,
+        run=partial(scrape_compa_recycle, scrape_instance),
+    )
+
+
+async def run_scrape_jobs(jobs: list[ScrapeJob]) -> dict:
+    """
+    Runs scrape jobs through the scheduler, recording a scrape_runs row per
+    scrape_instance so downloads only ever see completed scrapes. With
+    SCRAPE_DELTA_MODE on, each instance only stores the offers that changed
+    since the source's previous completed run.
+    """
+    instances = {job.scrape_instance: job.supplier for job in jobs}
+    trackers = {}
+    for scrape_instance, supplier in instances.items():
+        source_id = get_source_id(supplier)
+        tracker = await create_offer_tracker(scrape_instance, source_id)
+        await start_scrape_run(
+            scrape_instance,
+            source_id,
+            mode=tracker.mode,
+            base_instance=tracker.base_instance,
+            parent_instance=tracker.parent_instance,
+        )
+        trackers[scrape_instance] = tracker
+        register_tracker(tracker)
+
+    summary = {}
+    try:
+        scheduler = create_scrape_scheduler()
+        scheduler.extend(jobs)
+        summary = summarise_results(await scheduler.run())
+
+        for scrape_instance, entry in summary.items():
+            tracker = trackers[scrape_instance]
+            entry["mode"] = tracker.mode
+            entry["offers_unchanged"] = tracker.unchanged
+            if tracker.mode == RUN_MODE_DELTA and not entry["failed"]:
+                # offers that vanished since the previous run
+                tombstones = tracker.tombstones()
+                report = await bulk_insert(tombstones)
+                entry["offers_removed"] = len(tombstones)
+                entry["rows_written"] += report["rows_written"]
+                entry["rows_failed"] += report["rows_failed"]
+    finally:
+        # an interrupted or cancelled run has no summary entry and is marked
+        # failed, so it never lingers as "running"
+        for scrape_instance, tracker in trackers.items():
+            unregister_tracker(tracker)
+            entry = summary.get(scrape_instance)
+            status = run_status(entry) if entry else RUN_FAILED
+            row_count = entry["rows_written"] if entry else 0
+            if entry:
+                entry["status"] = status
+            if status == RUN_COMPLETED:
+                # offers in the snapshot, not rows stored by this run
+                row_count = tracker.snapshot_rows
+            await finish_scrape_run(scrape_instance, status, row_count)
+            if status == RUN_COMPLETED:
+                offer_index.scrape_completed(tracker.source_id)
+    return summary
+
+def log_finished_scrape(scrape: QueuedScrape):
+    log_to_supabase(
+        "info" if scrape.status == JOB_COMPLETED else "error",
+        f"Scrape job {scrape.status}",
+        {
+            "job_id": scrape.id,
+            "suppliers": sorted(scrape.suppliers),
+            "caller": scrape.caller,
+            "summary": scrape.summary,
+            "error": scrape.error,
+        },
+        source="FastAPI - scrape_jobs",
+    )
+
 
-        # insert into supabase
-    response = (
-        supabase_client.table("raw_product_scrapes").insert(insert_rows).execute()
+async def record_price_history(source_id: str, offers: SourceOffers):
+    # every newly indexed scrape also lands in the price history
+    await price_history.record(
+        source_id, offers.scrape_instance, offers.finished_at, offers.all()
     )
-    return response
+
+
+offer_index.listeners.append(record_price_history)
+
+# scrapes run in the background; endpoints only queue them
+scrape_job_queue = ScrapeJobQueue(run=run_scrape_jobs, on_finish=log_finished_scrape)
+
+
+def queue_scrape(jobs: list[ScrapeJob], caller: Optional[str] = None) -> dict:
+    """Queues a scrape and returns the ids to poll /scrape_jobs/{id} with."""
+    queued = scrape_job_queue.submit(jobs, caller=caller)
+    if queued["job_id"] is None:
+        queued["message"] = "A scrape for these suppliers is already queued or running."
+    else:
+        queued["message"] = "Scrape queued"
+        queued["status_url"] = f"/scrape_jobs/{queued['job_id']}"
+    return queued
+
+
+@app.get("/scrape_jobs/{job_id}", tags=["Scrape"])
+async def get_scrape_job(job_id: str):
+    """Status and progress of a queued scrape, by job id or scrape_instance."""
+    scrape = scrape_job_queue.get(job_id)
+    if scrape is None:
+        return {"message": f"No scrape job found for {job_id}.", "success": False}
+    return scrape.to_dict()
 
 
 @app.get("/scrape_all", tags=["Scrape"])
 async def scrape_all(
     request: Request, do_scrape: bool = False, caller: Optional[str] = None
 ):
+    caller = caller or "Unknown Caller"
+    if not do_scrape:
+        return {"message": "Scraping is disabled. Set do_scrape to True to enable."}
 
     # scrape foxway
-    await scrape_all_foxway(request=request, do_scrape=do_scrape, caller=caller)
+    jobs = foxway_scrape_jobs(str(uuid.uuid4()))
 
     # scrape Komsa
-    await scrape_all_komsa(request=request, do_scrape=do_scrape, caller=caller)
+    jobs.append(komsa_scrape_job(str(uuid.uuid4())))
 
     # scrape dipili
-    # await scrape_all_dipli()
+    # jobs.append(dipli_scrape_job(str(uuid.uuid4())))
 
     # scrape compa recycle
-    await scrape_all_compa_recycle(request=request, do_scrape=do_scrape, caller=caller)
+    jobs.append(compa_scrape_job(str(uuid.uuid4())))
+
+    log_to_supabase(
+        "info",
+        "Queueing scrape for all suppliers",
+        {
+            "jobs": [job.name for job in jobs],
+            "request_client": str(request.client),
+            "caller": caller,
+        },
+        source="FastAPI - scrape_all",
+    )
+
+    return queue_scrape(jobs, caller=caller)
 
 
 @app.get("/scrape_all_foxway", tags=["Scrape"])
@@ -328,16 +526,14 @@ async def scrape_all_foxway(
             source="FastAPI - scrape_all_foxway",
         )
         return {"message": "Scraping is disabled. Set do_scrape to True to enable."}
-    manufacturers = ["huawei", "apple", "samsung"]
-    partial_vat = [True, False]  # Example values for partial VAT
     scrape_instance = uuid.uuid4()  # uuid
 
     log_to_supabase(
         "info",
-        "Starting scrape for all manufacturers and VAT settings",
+        "Queueing scrape for all manufacturers and VAT settings",
         {
-            "manufacturers": manufacturers,
-            "partial_vat": partial_vat,
+            "manufacturers": FOXWAY_MANUFACTURERS,
+            "partial_vat": FOXWAY_VAT_MODES,
             "scrape_instance": str(scrape_instance),
             "request_client": str(request.client),
             "caller": caller,
@@ -345,277 +541,308 @@ async def scrape_all_foxway(
         source="FastAPI - scrape_all_foxway",
     )
 
-    # Iterate over manufacturers and VAT settings
-    for manufacturer in manufacturers:
-        for vat in partial_vat:
-            await scrape_foxway(manufacturer, vat, scrape_instance)
-
-    log_to_supabase(
-        "info",
-        "Completed scrape for all manufacturers and VAT settings",
-        {
-            "manufacturers": manufacturers,
-            "partial_vat": partial_vat,
-            "scrape_instance": str(scrape_instance),
-            "request_client": str(request.client),
-            "caller": caller,
-        },
-        source="FastAPI - scrape_all_foxway",
-    )
-
-    return {"message": "API Scrape Completed"}
+    # Fan out over manufacturers and VAT settings
+    return queue_scrape(foxway_scrape_jobs(str(scrape_instance)), caller=caller)
 
 
 @app.get("/download/latest_devices", tags=["Download"])
-async def download_latest_devices(source: SourceIDEnum):
-    """Endpoint to download the latest Foxway devices scrape data."""
-    supabase_client = get_supabase_client()
-
-    if source.lower() == "foxway":
-        source_id = settings.FOXWAY_SUPABASE_ID
-    elif source.lower() == "komsa":
-        source_id = settings.KOMSA_SUPABASE_ID
-    elif source.lower() == "compa":
-        source_id = settings.COMPA_SUPABASE_ID
-    elif source.lower() == "dipli":
-        source_id = settings.DIPLI_RECYCLE_SUPABASE_ID
-    else:
+async def download_latest_devices(
+    source: SourceIDEnum,
+    format: ExportFormat = ExportFormat.csv,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Endpoint to download the latest devices scrape data of a source, as CSV or
+    as a columnar Parquet / Arrow IPC snapshot with a precomputed SKU column.
+
+    Exports are cached on disk per scrape_instance, lookup table version and
+    format, and carry an ETag so unchanged downloads are answered with a 304.
+    """
+    source_id = get_source_id(source)
+    if source_id is None:
         return {"message": "Invalid source specified.", "success": False}
 
-    # 1. Identify the latest scrape_instance by fetching the most recent foxway scrape entry
-    latest_scrape_response = (
-        supabase_client.table("raw_product_scrapes")
-        .select("scrape_instance")
-        .eq("source_id", source_id)  # Filter by Foxway source ID
-        .order("entry_date", desc=True)
-        .limit(1)
-        .execute()
-    )
-    if not latest_scrape_response.data:
+    # 1. Identify the latest completed scrape_instance for the source
+    latest_run = await get_latest_completed_run(source_id)
+    if not latest_run:
         log_to_supabase(
             "error",
-            "No scrape entries found for Foxway.",
+            f"No completed scrapes found for {source.value}.",
             source="FastAPI - download_latest_foxway_devices",
         )
-        return {"message": "No scrape entries found for Foxway."}
-
-    latest_scrape_instance_uuid = latest_scrape_response.data[0].get("scrape_instance")
-
-    devices = get_devices_by_scrape_id(latest_scrape_instance_uuid)
+        return {"message": f"No completed scrapes found for {source.value}."}
 
-    if not devices:
-        return {"message": "No devices found."}
+    latest_scrape_instance_uuid = latest_run["scrape_instance"]
 
     # 2. Format data as CSV
-    result = create_downloadable_csv(devices, source=source)
-    if result is None:
+    sku_engine = await lookup_table_cache.get_engine()
+    if sku_engine is None:
         log_to_supabase(
             "error",
             "Failed to generate CSV: model code lookup table is missing.",
             source="FastAPI - download_latest_foxway_devices",
         )
         return {"message": "Failed to generate CSV: model code lookup table is missing."}
-    output, filename = result
-
-    log_to_supabase(
-        "info",
-        f"Successfully generated CSV for latest Foxway devices scrape. Filename: {filename}",
-        {"rows_exported": len(devices)},
-        source="FastAPI - download_latest_foxway_devices",
-    )
-
-    return StreamingResponse(
-        iter(
-            [output.getvalue()]
-        ),  # iter() is used as StreamingResponse expects an iterator
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
 
-
-def create_downloadable_csv(devices, source):
-    """Create a downloadable CSV from the device data."""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    # Write header
-    header = [
-        "make",
-        "model",
-        "storage_capacity",
-        "grade",
-        "purchase_price",
-        "stock_count",
-        "colour",
-        "ce_mark",
-        "partial_vat",
-        "SKU",
-    ]
-    writer.writerow(header)
-
-    model_codes = get_sku_lookup_table()
-    if model_codes is None:
-        return
-    # Write data rows
-    for row_data in devices:
-        sku = generate_sku(
-            make=row_data.get("make"),
-            model_name=row_data.get("model"),
-            storage_capacity=row_data.get("storage_capacity"),
-            colour=row_data.get("colour"),
-            grade=row_data.get("grade"),
-            model_codes=model_codes,
+    latest_scrape_datetime = latest_run.get("finished_at")
+    version = lookup_table_cache.version
+    etag = export_cache.etag(latest_scrape_instance_uuid, version, format.value)
+    # clients revalidate every time, since the latest scrape moves on
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=cache_headers)
+
+    suffix, media_type = EXPORT_FORMATS[format.value]
+    cached = export_cache.lookup(latest_scrape_instance_uuid, version, format.value)
+    if cached is None and format != ExportFormat.csv:
+        # built once per scrape_instance and lookup table version, then served from disk
+        cached = await export_cache.get(
+            latest_scrape_instance_uuid,
+            version,
+            format.value,
+            partial(get_devices_by_scrape_id, latest_scrape_instance_uuid),
+            sku_engine,
         )
-        writer.writerow(
-            [
-                row_data.get("make"),
-                row_data.get("model"),
-                row_data.get("storage_capacity"),
-                row_data.get("grade"),
-                row_data.get("purchase_price"),
-                row_data.get("stock_count"),
-                row_data.get("colour"),
-                row_data.get("ce_mark"),
-                row_data.get("partial_vat"),
-                sku,
-            ]
+    if cached is not None:
+        return FileResponse(
+            cached,
+            media_type=media_type,
+            filename=f"latest_devices_{source.value}_{latest_scrape_datetime}{suffix}",
+            headers=cache_headers,
         )
-    output.seek(0)  # Reset buffer position to the beginning
-    # 3. Serve the CSV file for download
-    # get the datetime from the firtst row
-    latest_scrape_datetime = devices[0].get("entry_date")
-    filename = f"latest_devices_{source}_{latest_scrape_datetime}.csv"
-    return output, filename
 
+    # only the first page is fetched before responding, the rest stream as they arrive
+    pages = iter_devices_by_scrape_id(latest_scrape_instance_uuid, latest_run)
+    first_page = await anext(pages, None)
+    if not first_page:
+        return {"message": "No devices found."}
 
-def get_devices_by_scrape_id(scrape_instance_id):
-    supabase_client = get_supabase_client()
+    filename = f"latest_devices_{source.value}_{latest_scrape_datetime}.csv"
 
-    columns_to_select = "make, model, storage_capacity, grade, purchase_price, stock_count, colour, ce_mark, partial_vat"
-    all_device_scrapes = []
-    page_size = 1000  # Align with suspected server-side limit
-    offset = 0
+    async def stream_csv():
+        # the first download streams as before and leaves the file in the cache
+        pending = export_cache.open_for_write(latest_scrape_instance_uuid, version, format.value)
+        try:
+            rows_exported = len(first_page)
+            chunk = render_devices_csv(first_page, sku_engine)
+            pending.write(chunk)
+            yield chunk
+            async for page in pages:
+                rows_exported += len(page)
+                chunk = render_devices_csv(page, sku_engine, header=False)
+                pending.write(chunk)
+                yield chunk
+            pending.commit()
+        except BaseException:
+            pending.abort()
+            raise
 
-    while True:
-        current_page_response = (
-            supabase_client.table("raw_product_scrapes")
-            .select(columns_to_select)
-            .eq("scrape_instance", scrape_instance_id)
-            .limit(page_size)
-            .offset(offset)
-            .execute()
+        log_to_supabase(
+            "info",
+            f"Successfully generated CSV for latest Foxway devices scrape. Filename: {filename}",
+            {"rows_exported": rows_exported},
+            source="FastAPI - download_latest_foxway_devices",
         )
 
-        if current_page_response.data:
-            all_device_scrapes.extend(current_page_response.data)
-            if len(current_page_response.data) < page_size:
-                # Last page fetched
-                break
-            offset += page_size
-        else:
-            # No more data or an error occurred on this page
-            break
-    return all_device_scrapes
-
-
-# Placeholder for a more robust model code generation/lookup
-# This will be the most complex part to get right and will need your detailed rules/mappings
-def get_model_code(make: str, model_name: str, model_codes: list) -> str:
-
-    make_lower = make.lower()
-    model_lower = model_name.lower()
-
-    for line in model_codes:
-        if line[0].lower() == make_lower:
-            if line[1].lower() == model_lower:
-                return line[2]
-
-    return "XXXXXX"
+    return StreamingResponse(
+        stream_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}", **cache_headers},
+    )
 
 
-def generate_sku(
-    make: str,
-    model_name: str,
-    storage_capacity: str,
-    colour: str,
-    grade: str,
-    model_codes: list,
-) -> str:
-    colour_code_map = sku_colour_map()
+@app.get("/download/latest_devices/all", tags=["Download"])
+async def download_latest_devices_all(
+    format: ExportFormat = ExportFormat.csv,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Latest devices of every source in one CSV / Parquet / Arrow file, with a
+    leading ``source`` column. Sources are resolved and exported concurrently
+    with one shared SKU engine, and both the per-source parts and the
+    combined file are served from the export cache on repeat downloads.
+    """
+    sources = list(SourceIDEnum)
+    runs = await asyncio.gather(
+        *(get_latest_completed_run(get_source_id(source)) for source in sources)
+    )
+    latest = {source.value: run for source, run in zip(sources, runs) if run}
+    if not latest:
+        return {"message": "No completed scrapes found for any source.", "success": False}
+    missing = [source.value for source, run in zip(sources, runs) if not run]
+    if missing:
+        log_to_supabase(
+            "warning",
+            f"Combined export without {', '.join(missing)}: no completed scrapes.",
+            source="FastAPI - download_latest_devices_all",
+        )
 
-    grade_code_map = sku_grade_map()
+    sku_engine = await lookup_table_cache.get_engine()
+    if sku_engine is None:
+        return {"message": "Failed to generate export: model code lookup table is missing."}
+
+    version = lookup_table_cache.version
+    key = combined_key({source: run["scrape_instance"] for source, run in latest.items()})
+    etag = export_cache.etag(key, version, format.value)
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=cache_headers)
+
+    async def write(tmp_path):
+        # every source is fetched and exported at once, sharing sku_engine
+        parts = await asyncio.gather(
+            *(
+                export_cache.get(
+                    run["scrape_instance"],
+                    version,
+                    format.value,
+                    partial(get_devices_by_scrape_id, run["scrape_instance"]),
+                    sku_engine,
+                )
+                for run in latest.values()
+            )
+        )
+        await asyncio.to_thread(
+            write_combined, list(zip(latest, parts)), tmp_path, format.value
+        )
 
-    # 1. Get Model Code
-    raw_model_code = get_model_code(
-        make if make else "", model_name if model_name else "", model_codes
+    path = await export_cache.get_or_build(key, version, format.value, write)
+    suffix, media_type = EXPORT_FORMATS[format.value]
+    log_to_supabase(
+        "info",
+        "Served combined devices export",
+        {
+            "format": format.value,
+            "scrape_instances": {source: run["scrape_instance"] for source, run in latest.items()},
+        },
+        source="FastAPI - download_latest_devices_all",
+    )
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=f"latest_devices_all_{datetime.date.today().isoformat()}{suffix}",
+        headers={**cache_headers, "X-Sources": ",".join(latest)},
     )
 
-    # 2. Determine Capacity Code
-    cap_code = ""
-    storage_input_str = str(
-        storage_capacity if storage_capacity else ""
-    ).upper()  # Normalize input
-    if "TB" in storage_input_str:
-        num_match = re.search(r"(\d+)", storage_input_str)
-        cap_code = num_match.group(1) if num_match else "X"  # e.g. "1" for 1TB
-    elif "GB" in storage_input_str:
-        num_match = re.search(r"(\d+)", storage_input_str)
-        cap_code = num_match.group(1) if num_match else "XXX"  # e.g. "64", "128"
-    if not cap_code:  # If still empty (e.g. input was just "Unknown Storage" or empty)
-        cap_code = "XXX"  # Fallback
-
-    # 3. Determine Colour Code
-    normalized_colour_key = (colour if colour else "").strip()
-    col_code = "XX"  # Default fallback
-    # Case-insensitive lookup for colour
-    for map_key, map_val in colour_code_map.items():
-        if map_key.lower() == normalized_colour_key.lower():
-            col_code = map_val
-            break
 
-    # 4. Determine Grade Code
-    normalized_grade_key = (grade if grade else "").strip()
-    grd_code = "XX"  # Default fallback
-    # Case-insensitive lookup for grade
-    for map_key, map_val in grade_code_map.items():
-        if map_key.lower() == normalized_grade_key.lower():  # Compare normalized keys
-            grd_code = map_val
-            break
+@app.get("/prices/best", tags=["Prices"])
+async def best_price(
+    sku: Optional[str] = None,
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    storage_capacity: Optional[str] = None,
+    grade: Optional[str] = None,
+    colour: Optional[str] = None,
+    in_stock: bool = True,
+):
+    """
+    Cheapest offer across the latest scrape of every source, for a SKU or a
+    make/model/storage_capacity/grade/colour key. Served from the in-memory
+    offer index, which is rebuilt whenever a scrape completes.
+    """
+    key = None
+    if sku is None:
+        if not all((make, model, storage_capacity, grade, colour)):
+            return {
+                "message": "Pass a sku, or make, model, storage_capacity, grade and colour.",
+                "success": False,
+            }
+        sku_engine = await lookup_table_cache.get_engine()
+        if sku_engine is None:
+            return {"message": "Model code lookup table is missing.", "success": False}
+        sku = sku_engine.generate(make, model, storage_capacity, colour, grade)
+        # unknown model codes share a SKU, so key queries also match the offer itself
+        key = price_key(make, model, storage_capacity, grade, colour)
+
+    offer, sources = offer_index.best(sku.strip().upper(), key, in_stock=in_stock)
+    if offer is None:
+        return {"message": f"No {'in-stock ' if in_stock else ''}offer found for {sku}.", "success": False}
+    return {
+        "sku": offer["sku"],
+        "offer": {name: value for name, value in offer.items() if name != "key"},
+        "sources_with_offer": sources,
+        "success": True,
+    }
 
-    # 5. Assemble SKU with Padding
-    prefix = "M-"
 
-    model_code_segment = prefix + raw_model_code.upper()
-    suffix_segment = cap_code.upper() + col_code.upper() + grd_code.upper()
+@app.get("/prices/history", tags=["Prices"])
+async def price_history_by_day(
+    sku: str,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    source: Optional[SourceIDEnum] = None,
+):
+    """
+    Lowest, median and highest offer price per day for a SKU, across every
+    source or just ``source``. Served from the price rollups and the local
+    Parquet archive written as scrapes complete, never from raw rows.
+    """
+    # scrape days are recorded in UTC
+    end = end or datetime.datetime.now(datetime.timezone.utc).date()
+    start = start or end - datetime.timedelta(days=settings.PRICE_HISTORY_DEFAULT_DAYS)
+    if start > end:
+        return {"message": "start must not be after end.", "success": False}
+    if (end - start).days > settings.PRICE_HISTORY_MAX_DAYS:
+        return {
+            "message": f"Date range is limited to {settings.PRICE_HISTORY_MAX_DAYS} days.",
+            "success": False,
+        }
 
-    padding_len = 15 - (len(model_code_segment) + len(suffix_segment))
+    sources = [source] if source else list(SourceIDEnum)
+    days = await price_history.daily(
+        sku.strip().upper(),
+        start.isoformat(),
+        end.isoformat(),
+        [get_source_id(source) for source in sources],
+    )
+    return {
+        "sku": sku.strip().upper(),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "sources": [source.value for source in sources],
+        "days": days,
+        "success": True,
+    }
 
-    padding_segment = ""
-    if padding_len > 0:
-        padding_segment = "X" * padding_len
-    elif padding_len < 0:
-        # Components are too long, truncate raw_model_code.
-        max_raw_model_len = 15 - len(prefix) - len(suffix_segment)
-        if max_raw_model_len < 0:
-            max_raw_model_len = 0
 
-        if len(raw_model_code) > max_raw_model_len:
-            raw_model_code = raw_model_code[:max_raw_model_len]
+@app.get("/prices/index", tags=["Prices"])
+async def price_index_status():
+    """Which scrape of each source the best-price index was built from."""
+    return offer_index.status()
 
-        model_code_segment = prefix + raw_model_code.upper()
-        padding_len = 15 - (len(model_code_segment) + len(suffix_segment))
-        padding_segment = "X" * padding_len if padding_len > 0 else ""
 
-    final_sku = model_code_segment + padding_segment + suffix_segment
+DEVICE_COLUMNS = "scrape_id, make, model, storage_capacity, grade, purchase_price, stock_count, colour, ce_mark, partial_vat"
+DEVICE_PAGE_SIZE = 1000  # Align with suspected server-side limit
 
-    if len(final_sku) > 15:
-        final_sku = final_sku[:15]
-    elif len(final_sku) < 15:
-        final_sku = final_sku.ljust(15, "X")
 
-    return final_sku.upper()
+async def iter_devices_by_scrape_id(
+    scrape_instance_id, run: Optional[dict] = None
+) -> AsyncIterator[list[dict]]:
+    """
+    Yields the devices of a scrape instance one page at a time. Full runs are
+    read in scrape_id order; delta runs are rebuilt from their base first.
+    """
+    if run is None:
+        run = await get_scrape_run(scrape_instance_id)
+    if run and run.get("mode") == RUN_MODE_DELTA:
+        devices = await get_devices_by_scrape_id(scrape_instance_id)
+        for start in range(0, len(devices), DEVICE_PAGE_SIZE):
+            yield devices[start : start + DEVICE_PAGE_SIZE]
+        return
 
+    async for page in db.paginate(
+        "raw_product_scrapes",
+        DEVICE_COLUMNS,
+        filters={"scrape_instance": scrape_instance_id},
+        page_size=DEVICE_PAGE_SIZE,
+        key="scrape_id",
+    ):
+        yield page
 
 
+async def get_devices_by_scrape_id(scrape_instance_id) -> list[dict]:
+    """Full snapshot of a scrape instance, applying base + deltas for delta runs."""
+    return await load_snapshot(scrape_instance_id, DEVICE_COLUMNS)
 
 
 @app.get("/scrape_all_komsa", tags=["Scrape"])
@@ -641,25 +868,13 @@ async def scrape_all_komsa(
         source="FastAPI - scrape_all_komsa",
     )
 
-    # Simulate scraping process
-    await scrape_komsa_excel(str(scrape_instance))
-    log_to_supabase(
-        "info",
-        "Scraping Komsa completed",
-        {
-            "do_scrape": do_scrape,
-            "request_client": str(request.client),
-            "caller": caller,
-        },
-        source="FastAPI - scrape_all_komsa",
-    )
-    return {"message": "Komsa scrape completed successfully."}
+    return queue_scrape([komsa_scrape_job(str(scrape_instance))], caller=caller)
 
 
 async def scrape_komsa_excel(scrape_instance: str):
     try:
         # fetch the komsa df from the excel online file
-        df = fetch_excel_as_df(settings.KOMSA_URL)
+        df = await fetch_excel_as_df(settings.KOMSA_URL)
 
         # prepare the dataframe for insertion
         df.columns = [col.strip() for col in df.columns]  # Clean column names
@@ -674,70 +889,48 @@ async def scrape_komsa_excel(scrape_instance: str):
                 "Shop": "source",
             }
         )
-        # Convert the DataFrame to a list of dictionaries
-        data_to_insert = df.to_dict(orient="records")
-
-        insert_rows = []
-        for line in data_to_insert:
-            try:
-                # Extract manufacturer from the description
-                manufacturer, model, storage, grade, colour = parse_komsa_info(line)
-
-                stock_count = (
-                    line["stock_count"] if isinstance(line["stock_count"], int) else 0
-                )  # Ensure stock_count is an integer
-
-                # remove any non-numeric characters from stock_count such as >100
-                if isinstance(stock_count, str):
-                    stock_count = re.sub(r"\D", "", stock_count)
-                    stock_count = int(stock_count) if stock_count.isdigit() else 0
-
-                row_data = RawProductScrape(
-                    source_id=settings.KOMSA_SUPABASE_ID,
-                    make=manufacturer,
-                    model=model,
-                    storage_capacity=storage,
-                    grade=grade,
-                    colour=colour,
-                    ce_mark=None,
-                    partial_vat=False,
-                    purchase_price=line["purchase_price"],
-                    trade_in_price=None,
-                    stock_count=stock_count,
-                    meta_data=json.dumps(line),
-                    scrape_instance=str(scrape_instance) if scrape_instance else None,
-                )
+        # Stream the sheet into Supabase in slices, each normalized column-wise
+        rejected = []
 
-                # append the row to the insert list
-                row = create_db_row(data=row_data)
-                insert_rows.append(row)
+        def normalize(frame: pd.DataFrame) -> list[dict]:
+            rows, rejected_rows = normalize_komsa_frame(frame, scrape_instance)
+            if not rejected_rows.empty:
+                rejected.append(rejected_rows)
+            return rows
 
-            except Exception as e:
-                # log_to_supabase("error", f"Error processing line {line}: {e}",
-                #                 {"line": line, "scrape_instance": scrape_instance},
-                #                 source="FastAPI - scrape_komsa")
-                print(f"Error processing line {line}: {e}")
-
-        # Insert the data into Supabase
-        supabase_client = get_supabase_client()
-        response = (
-            supabase_client.table("raw_product_scrapes").insert(insert_rows).execute()
+        result = await run_pipeline(
+            iter_dataframe_slices(df, settings.PIPELINE_BATCH_ROWS), normalize
         )
+        if rejected:
+            rejected_rows = pd.concat(rejected)
+            log_to_supabase(
+                "warning",
+                f"Komsa: {len(rejected_rows)} sheet rows rejected",
+                {
+                    "scrape_instance": scrape_instance,
+                    "reasons": rejected_rows["reason"].value_counts().to_dict(),
+                    "sample": json.loads(
+                        rejected_rows.head(20).to_json(orient="records", force_ascii=False)
+                    ),
+                },
+                source="FastAPI - scrape_komsa",
+            )
+        return result
 
-        return response
-
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         log_to_supabase(
             "error",
             f"Error downloading the Excel file: {e}",
             source="FastAPI - scrape_komsa",
         )
         print(f"Error downloading the Excel file: {e}")
+        raise
     except ValueError as e:
         log_to_supabase(
             "error", f"URL parsing error: {e}", source="FastAPI - scrape_komsa"
         )
         print(f"URL parsing error: {e}")
+        raise
     except Exception as e:
         log_to_supabase(
             "error",
@@ -745,79 +938,108 @@ async def scrape_komsa_excel(scrape_instance: str):
             source="FastAPI - scrape_komsa",
         )
         print(f"An error occurred during processing: {e}")
+        # re-raise so the scheduler records the job as failed
+        raise
+
+
+# translate grades from German to English
+KOMSA_GRADES = {
+    "Neuwertig": "Excellent",
+    "Wie Neu": "Like New",
+    "Gut": "Good",
+    "Akzeptabel": "Acceptable",
+    "Sehr Gut": "Very Good",
+}
+
+# compiled once rather than rebuilding and scanning the map for every row
+KOMSA_COLOURS = ColourMatcher(komsa_colour_map())
+
+
+def normalize_komsa_frame(
+    df: pd.DataFrame, scrape_instance: Optional[str] = None
+) -> tuple[list[dict], pd.DataFrame]:
+    """
+    Normalizes a slice of the Komsa sheet column by column.
+
+    Returns the insert-ready rows and a frame of the rejected sheet rows,
+    each with the ``reason`` it was rejected.
+    """
+    description = df["Description"].astype("string").str.strip()
+    price = pd.to_numeric(df["purchase_price"], errors="coerce")
+
+    reason = pd.Series(pd.NA, index=df.index, dtype="string")
+    reason = reason.mask(price.isna(), "missing or invalid purchase_price")
+    reason = reason.mask(description.fillna("") == "", "missing Description")
+    rejected = df[reason.notna()].assign(reason=reason[reason.notna()])
+
+    accepted = reason.isna()
+    df, description, price = df[accepted], description[accepted], price[accepted]
+    if df.empty:
+        return [], rejected
+
+    lowered = description.str.lower()
+    # Assuming the first word is the manufacturer
+    manufacturer = lowered.str.split(n=1).str[0].replace({"airpods": "apple"})
+
+    # descriptions repeat across grades, so each distinct one is parsed once
+    parsed = {}
+    for text, make in zip(lowered, manufacturer):
+        if (text, make) not in parsed:
+            storage, model = split_product_name(text, [make])
+            colour, model = KOMSA_COLOURS.split(model)
+            parsed[(text, make)] = (storage, model, colour)
+    storage, model, colour = zip(*(parsed[key] for key in zip(lowered, manufacturer)))
+
+    grade = (
+        df["grade"]
+        .astype("string")
+        .fillna("")
+        .str.replace("Grade ", "", regex=False)
+        .replace(KOMSA_GRADES)
+    )
 
+    # counts such as ">100" keep their digits, anything else is 0
+    stock = df["stock_count"]
+    stock_count = (
+        pd.to_numeric(stock, errors="coerce")
+        .fillna(
+            pd.to_numeric(
+                stock.astype("string").str.replace(r"\D", "", regex=True),
+                errors="coerce",
+            )
+        )
+        .fillna(0)
+        .astype(int)
+    )
 
-def parse_komsa_info(line):
-    manufacturer = (
-        line["Description"].split()[0].lower()
-    )  # Assuming the first word is the manufacturer
-
-    # Handle specific cases for manufacturers
-    if manufacturer == "airpods":
-        manufacturer = "apple"
-
-    # Clean up the model name
-    model = line["Description"].lower()  # Convert to lowercase
-    # remove manufacturer from model name
-    model = model.replace(manufacturer, "").strip()
-
-    # Determine storage capacity from the description
-    storage = "Unknown Storage"  # Default value if not found
-    storage_matches = [
-        size
-        for size in [
-            " 128gb",
-            " 64gb",
-            " 32gb",
-            " 256gb",
-            " 512gb",
-            " 16gb",
-            " 8gb",
-            " 4gb",
-            " 2gb",
-            " 1tb",
-            " 2tb",
-            " 4tb",
-        ]
-        if size in model
-    ]
-
-    if (
-        len(storage_matches) == 1
-    ):  # If exactly one storage size is found, else leave as "Unknown Storage"
-        storage = storage_matches[0]
-        model = model.replace(storage, "").strip()  # Remove size from model name
-
-    if manufacturer == "apple":
-        print(f"Model: {model}, Storage: {storage}")
-
-    # Clean up the grade
-    grade = line["grade"].replace("Grade ", "") if line["grade"] else ""
-
-    # translate grades from German to English
-    grade_translation = {
-        "Neuwertig": "Excellent",
-        "Wie Neu": "Like New",
-        "Gut": "Good",
-        "Akzeptabel": "Acceptable",
-        "Sehr Gut": "Very Good",
-    }
-    grade = grade_translation.get(
-        grade, grade
-    )  # Default to original if not found in translation
-
-    # Map various possible colour names to a simplified set
-    colour_map = komsa_colour_map()
-    # Try to extract a colour from the model/description
-    colour = "Unknown"
-
-    for key, simple_colour in colour_map.items():
-        if key.lower() in model:
-            colour = simple_colour
-            model = model.replace(key, "").strip()
-            break
-
-    return manufacturer, model, storage, grade, colour
+    rows = pd.DataFrame(
+        {
+            "source_id": settings.KOMSA_SUPABASE_ID,
+            "make": manufacturer,
+            "model": model,
+            "storage_capacity": storage,
+            "grade": grade,
+            "colour": colour,
+            "ce_mark": None,
+            "partial_vat": False,
+            "purchase_price": price.astype(float),
+            "trade_in_price": None,
+            "stock_count": stock_count,
+            "payload_hash": [
+                payload_store.add(line, settings.KOMSA_SUPABASE_ID)
+                for line in df.to_dict(orient="records")
+            ],
+            "scrape_instance": str(scrape_instance) if scrape_instance else None,
+        },
+        index=df.index,
+    )
+    valid, invalid = validate_scrape_rows(rows.astype(object).to_dict(orient="records"))
+    if invalid:
+        failed = df.iloc[[position for position, _ in invalid]]
+        rejected = pd.concat(
+            [rejected, failed.assign(reason=[error for _, error in invalid])]
+        )
+    return valid, rejected
 
 
 @app.get("/scrape_dipli", tags=["Scrape"])
@@ -827,64 +1049,35 @@ async def scrape_all_dipli(
 
     scrape_instance = uuid.uuid4()
 
-    data = await get_dipli_data()
+    return queue_scrape([dipli_scrape_job(str(scrape_instance))], caller=caller)
+
 
+async def scrape_dipli(scrape_instance: Optional[str] = None):
     # for testing if we dont want to continueously hit thier server
     # filename = save_data_to_disk(data, 'dipli)
     # loaded_data = load_data_from_disk(filename)
 
-    insert_rows = []
-    for line in data["result"]:
+    # each page is normalized and written while the next one downloads
+    return await run_pipeline(
+        get_dipli_pages(),
+        partial(normalize_dipli_rows, scrape_instance=scrape_instance),
+    )
+
+
+def normalize_dipli_rows(lines: list, scrape_instance: Optional[str] = None) -> list[dict]:
+    rows = []
+    for line in lines:
         # print(f"Processing line: {line} ----------------------------------------------")
         try:
             # Extract manufacturer from the description
 
             manufacturer = line.get("brand", "")
-            # Try to extract storage from the model name or grouped_name
-            storage = "Unknown Storage"
-            for size in [
-                "128GB",
-                "64GB",
-                "32GB",
-                "256GB",
-                "512GB",
-                "16GB",
-                "8GB",
-                "4GB",
-                "2GB",
-                "1TB",
-                "2TB",
-                "4TB",
-                "128",
-                "64",
-                "32",
-                "256",
-                "512",
-                "16",
-                "8",
-                "4",
-                "2",
-            ]:
-                if size in line.get("name", ""):
-                    storage = size if "GB" in size or "TB" in size else f"{size}GB"
-                    break
-                elif size in line.get("grouped_name", ""):
-                    storage = size if "GB" in size or "TB" in size else f"{size}GB"
-                    break
-
-            model = line.get("name", "")
-            if manufacturer and manufacturer.lower() in model.lower():
-                pattern = re.compile(re.escape(manufacturer), re.IGNORECASE)
-                model = pattern.sub("", model).strip()
-            # Remove storage from model name, handling both with and without GB/TB
-            if storage and storage != "Unknown Storage":
-                storage_variants = [storage]
-                # If storage ends with GB or TB, also consider just the number
-                if storage.endswith("GB") or storage.endswith("TB"):
-                    storage_number = storage.replace("GB", "").replace("TB", "").strip()
-                    storage_variants.append(storage_number)
-                for variant in storage_variants:
-                    model = model.replace(variant, "").strip()
+            # Take storage from the name, falling back to grouped_name
+            storage, model = split_product_name(
+                line.get("name", ""), [manufacturer], bare_numbers=True
+            )
+            if storage == UNKNOWN_STORAGE:
+                storage = parse_storage(line.get("grouped_name", ""), bare_numbers=True)
 
             grade = line.get("grade", "").replace("Grade ", "")
 
@@ -903,23 +1096,23 @@ async def scrape_all_dipli(
             partial_vat = False
             trade_in_price = None
 
-            db_row_data = RawProductScrape(
-                source_id=settings.DIPLI_RECYCLE_SUPABASE_ID,
-                make=manufacturer,
-                model=model,
-                storage_capacity=storage,
-                grade=grade,
-                colour=colour,
-                ce_mark=ce_mark,
-                partial_vat=partial_vat,
-                purchase_price=purchase_price,
-                trade_in_price=trade_in_price,
-                stock_count=stock_count,
-                meta_data=json.dumps(line),
-                scrape_instance=str(scrape_instance) if scrape_instance else None,
+            rows.append(
+                {
+                    "source_id": settings.DIPLI_RECYCLE_SUPABASE_ID,
+                    "make": manufacturer,
+                    "model": model,
+                    "storage_capacity": storage,
+                    "grade": grade,
+                    "colour": colour,
+                    "ce_mark": ce_mark,
+                    "partial_vat": partial_vat,
+                    "purchase_price": purchase_price,
+                    "trade_in_price": trade_in_price,
+                    "stock_count": stock_count,
+                    "payload_hash": payload_store.add(line, settings.DIPLI_RECYCLE_SUPABASE_ID),
+                    "scrape_instance": str(scrape_instance) if scrape_instance else None,
+                }
             )
-            row = create_db_row(data=db_row_data)
-            insert_rows.append(row)
 
         except Exception as e:
             # log_to_supabase("error", f"Error processing line {line}: {e}",
@@ -927,39 +1120,33 @@ async def scrape_all_dipli(
             #                 source="FastAPI - scrape_komsa")
             print(f"Error processing line {line}: {e}")
 
-    # Insert the data into Supabase
-    supabase_client = get_supabase_client()
-    response = (
-        supabase_client.table("raw_product_scrapes").insert(insert_rows).execute()
-    )
-
-    return response
+    # the whole page is validated in one call rather than a model per row
+    return validated_rows(rows)
 
 
-async def get_dipli_data():
+async def get_dipli_pages(
+    client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[list[dict]]:
+    """Yields each page of Dipli results as soon as it is downloaded."""
     api_key = settings.DIPLI_RECYCLE_API_KEY
     page_size = 100
     url_base = settings.DIPLI_RECYCLE_URL
     headers = {"apikey": api_key}
 
-    all_results = []
     page = 1
 
     while True:
         url = f"{url_base}?pageSize={page_size}&page={page}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+        response = await http_get(url, client=client, headers=headers)
+        response.raise_for_status()
+        data = response.json()
         results = data.get("result", [])
-        all_results.extend(results)
+        if results:
+            yield results
         if len(results) < page_size:
             break
         page += 1
 
-    # Return the full data structure, or just the results if you prefer
-    return {"result": all_results}
-
 
 @app.get("/scrape_compa_recycle", tags=["Scrape"])
 async def scrape_all_compa_recycle(
@@ -979,14 +1166,25 @@ async def scrape_all_compa_recycle(
         source="FastAPI - scrape_all_komsa",
     )
 
+    return queue_scrape([compa_scrape_job(str(scrape_instance))], caller=caller)
+
+
+async def scrape_compa_recycle(scrape_instance: Optional[str] = None):
     data = await get_compa_data()
 
     # For testing, you can save and load from disk
     # filename = save_data_to_disk(data, 'compa_recycle')
     # data = load_data_from_disk(filename)
 
-    insert_rows = []
-    for line in data.get("results", []):
+    return await run_pipeline(
+        iter_batches(data.get("results", []), settings.PIPELINE_BATCH_ROWS),
+        partial(normalize_compa_rows, scrape_instance=scrape_instance),
+    )
+
+
+def normalize_compa_rows(lines: list, scrape_instance: Optional[str] = None) -> list[dict]:
+    rows = []
+    for line in lines:
         try:
             manufacturer = line.get("manufacturer", "")
             if manufacturer.lower() not in ["apple", "samsung"]:
@@ -995,12 +1193,10 @@ async def scrape_all_compa_recycle(
             model = line.get("product_model", "")
 
             # Extract storage from 'product' field, e.g., "iPhone 11 64Go"
-            storage_match = re.search(
-                r"(\d+)\s*(Go|GB)", line.get("product", ""), re.IGNORECASE
-            )
-            storage = (
-                f"{storage_match.group(1)}GB" if storage_match else "Unknown Storage"
-            )
+            storage = parse_storage(line.get("product", ""))
+
+            # every grade row of this product shares one stored payload
+            payload_hash = payload_store.add(line, settings.COMPA_SUPABASE_ID)
 
             # These fields are not in the Compa data structure
             colour = "Unknown"
@@ -1022,25 +1218,25 @@ async def scrape_all_compa_recycle(
 
                     # Skip this grade if the purchase price is 0
                     if purchase_price > 0:
-                        db_row_data = RawProductScrape(
-                            source_id=settings.COMPA_SUPABASE_ID,
-                            make=manufacturer,
-                            model=model,
-                            storage_capacity=storage,
-                            grade=grade,
-                            colour=colour,
-                            ce_mark=ce_mark,
-                            partial_vat=partial_vat,
-                            purchase_price=purchase_price,
-                            trade_in_price=trade_in_price,
-                            stock_count=stock_count,
-                            meta_data=json.dumps(line),
-                            scrape_instance=(
-                                str(scrape_instance) if scrape_instance else None
-                            ),
+                        rows.append(
+                            {
+                                "source_id": settings.COMPA_SUPABASE_ID,
+                                "make": manufacturer,
+                                "model": model,
+                                "storage_capacity": storage,
+                                "grade": grade,
+                                "colour": colour,
+                                "ce_mark": ce_mark,
+                                "partial_vat": partial_vat,
+                                "purchase_price": purchase_price,
+                                "trade_in_price": trade_in_price,
+                                "stock_count": stock_count,
+                                "payload_hash": payload_hash,
+                                "scrape_instance": (
+                                    str(scrape_instance) if scrape_instance else None
+                                ),
+                            }
                         )
-                        row = create_db_row(data=db_row_data)
-                        insert_rows.append(row)
 
         except Exception as e:
             # Basic error logging
@@ -1048,28 +1244,10 @@ async def scrape_all_compa_recycle(
             # For production, consider logging to Supabase as in other scrapers
             # log_to_supabase("error", f"Error processing Compa line: {e}", {"line": line, "scrape_instance": scrape_instance}, source="FastAPI - scrape_all_compa_recycle")
 
-    if insert_rows:
-        supabase_client = get_supabase_client()
-        response = (
-            supabase_client.table("raw_product_scrapes").insert(insert_rows).execute()
-        )
+    return validated_rows(rows)
 
-    log_to_supabase(
-        "info",
-        "Scraping Compa completed",
-        {
-            "do_scrape": do_scrape,
-            "request_client": str(request.client),
-            "caller": caller,
-            "scrape_instrance": str(scrape_instance),
-        },
-        source="FastAPI - scrape_all_komsa",
-    )
-
-    return {"message": "Completed"}
 
-
-async def get_compa_data():
+async def get_compa_data(client: Optional[httpx.AsyncClient] = None):
     url = f"{settings.COMPA_URL}/Argus/getList"
     headers = {
         "accept": "application/json",
@@ -1077,11 +1255,10 @@ async def get_compa_data():
         "X-PRIVATE-API-KEY": settings.COMPA_PRIVATE_KEY,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        response.raise_for_status()
+    response = await http_get(url, client=client, headers=headers)
+    response.raise_for_status()
 
-        data = response.json()
+    data = response.json()
     return data
 
 
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, StringConstraints, TypeAdapter, ValidationError
+from typing import Annotated, Optional
+from typing_extensions import TypedDict
 
 class RawProductScrapeData(BaseModel):
     make: str
@@ -25,10 +26,51 @@ class RawProductScrape(BaseModel):
     purchase_price: float
     trade_in_price: Optional[float] = None
     stock_count: int
-    meta_data: str  # JSON string
+    payload_hash: str  # key of the raw supplier item in scrape_payloads
     scrape_instance: Optional[str] = None
 
+class RawProductScrapeRow(TypedDict):
+    """A raw_product_scrapes row as the scrapers insert it, validated in batches."""
+
+    source_id: str
+    make: str
+    model: str
+    storage_capacity: Annotated[str, StringConstraints(to_upper=True)]
+    grade: str
+    colour: str
+    ce_mark: Optional[bool]
+    partial_vat: bool
+    purchase_price: float
+    trade_in_price: Optional[float]
+    stock_count: int
+    payload_hash: str
+    scrape_instance: Optional[str]
+
+# validates a whole batch in one call and returns plain dicts, ready to insert
+scrape_rows_adapter = TypeAdapter(list[RawProductScrapeRow])
+
+def validate_scrape_rows(rows: list[dict]) -> tuple[list[dict], list[tuple[int, str]]]:
+    """
+    Validates normalized rows as one batch. Returns the DB-ready rows and,
+    for any row that failed, its position in ``rows`` with the errors.
+    """
+    try:
+        return scrape_rows_adapter.validate_python(rows), []
+    except ValidationError as e:
+        errors: dict[int, list[str]] = {}
+        for error in e.errors():
+            index, *field = error["loc"]
+            errors.setdefault(index, []).append(f"{'.'.join(map(str, field))}: {error['msg']}")
+    valid = [row for index, row in enumerate(rows) if index not in errors]
+    rejected = [(index, "; ".join(messages)) for index, messages in sorted(errors.items())]
+    return scrape_rows_adapter.validate_python(valid), rejected
+
 class RawProductScrapeMeta(BaseModel):
     source_id: str
-    meta_data: str  # JSON string
+    payload_hash: str
     scrape_instance: Optional[str] = None
+
+class ScrapePayload(BaseModel):
+    payload_hash: str  # blake2b of the canonical JSON
+    source_id: Optional[str] = None
+    payload: dict
@@ -0,0 +1,262 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Optional
+
+
+UNKNOWN_STORAGE = "Unknown Storage"
+UNKNOWN_COLOUR = "Unknown"
+
+# capacities the scrapers recognise, anything else is left as unknown storage
+STORAGE_SIZES = {
+    "GB": (2, 4, 8, 16, 32, 64, 128, 256, 512),
+    "TB": (1, 2, 4),
+}
+# product names repeat heavily (per grade, per VAT mode, across scrapes), so
+# parsed names are memoized
+PARSE_CACHE_SIZE = 65_536
+
+# every accepted capacity token, lowercased, mapped to its size in GB:
+# "128gb", "1tb" and the French "64go"/"1to"
+_CAPACITY_TOKENS: dict[str, int] = {}
+for _unit, _suffixes, _scale in (("GB", ("gb", "go"), 1), ("TB", ("tb", "to"), 1024)):
+    for _size in STORAGE_SIZES[_unit]:
+        for _suffix in _suffixes:
+            _CAPACITY_TOKENS[f"{_size}{_suffix}"] = _size * _scale
+# units that may follow the number as a separate word ("128 GB"); not "to",
+# which would turn "2 to 4" into 2TB
+_SPACED_UNITS = {"gb", "tb"}
+# bare numbers some suppliers use ("iPhone 11 64"); smaller sizes are left out
+# because they clash with model numbers such as "iPhone 12" or "Galaxy S8"
+_BARE_CAPACITIES = {"32": 32, "64": 64, "128": 128, "256": 256, "512": 512}
+_PUNCTUATION = "()[],;:"
+
+
+def clean_spaces(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _label(capacity_gb: int) -> str:
+    if capacity_gb >= 1024:
+        return f"{capacity_gb // 1024}TB"
+    return f"{capacity_gb}GB"
+
+
+def split_storage(text: Optional[str], bare_numbers: bool = False) -> tuple[str, str]:
+    """
+    Finds the storage capacity in a product name.
+
+    Returns the capacity label (e.g. "128GB", "1TB") and the text with every
+    recognised capacity removed. When a name carries several (RAM and
+    storage, "8GB 128GB") the largest is the storage. ``bare_numbers`` also
+    accepts unit-less sizes from 32 up, used only when no unit is present.
+    """
+    return split_product_name(text, (), bare_numbers)
+
+
+def parse_storage(text: Optional[str], bare_numbers: bool = False) -> str:
+    return split_product_name(text, (), bare_numbers)[0]
+
+
+def make_set(makes: Iterable[str]) -> frozenset[str]:
+    """Lowercased manufacturer names, built once per supplier for ``split_product_name``."""
+    return frozenset(make.lower() for make in makes if make)
+
+
+def strip_makes(text: Optional[str], makes: Iterable[str]) -> str:
+    """Removes whole-word manufacturer names (any case) from a model name."""
+    makes = makes if isinstance(makes, frozenset) else make_set(makes)
+    return _strip_makes(text or "", makes)
+
+
+def split_product_name(
+    text: Optional[str], makes: Iterable[str] = (), bare_numbers: bool = False
+) -> tuple[str, str]:
+    """
+    Splits a product name into its storage capacity and the model, in a
+    single pass over its words: capacities (see ``split_storage``) and
+    whole-word manufacturer names are dropped from the model.
+    """
+    makes = makes if isinstance(makes, frozenset) else make_set(makes)
+    if any(" " in make for make in makes):
+        # multi-word names need a pattern rather than a word filter
+        return _split_product_name(_strip_makes(text or "", makes), frozenset(), bare_numbers)
+    return _split_product_name(text or "", makes, bare_numbers)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _split_product_name(
+    text: str, makes: frozenset[str], bare_numbers: bool
+) -> tuple[str, str]:
+    words = text.split()
+    kept = []
+    best = 0
+    skip_next = False
+    for index, word in enumerate(words):
+        if skip_next:
+            skip_next = False
+            continue
+        key = word.strip(_PUNCTUATION).lower()
+        if key in makes:
+            continue
+        capacity = _CAPACITY_TOKENS.get(key)
+        if capacity is None and key.isdigit() and index + 1 < len(words):
+            unit = words[index + 1].strip(_PUNCTUATION).lower()
+            if unit in _SPACED_UNITS:
+                capacity = _CAPACITY_TOKENS.get(key + unit)
+                skip_next = capacity is not None
+        if capacity is None:
+            kept.append(word)
+        elif capacity > best:
+            best = capacity
+
+    if not best and bare_numbers:
+        remaining = []
+        for word in kept:
+            capacity = _BARE_CAPACITIES.get(word.strip(_PUNCTUATION))
+            if capacity is None:
+                remaining.append(word)
+            elif capacity > best:
+                best = capacity
+        kept = remaining
+
+    if not best:
+        return UNKNOWN_STORAGE, " ".join(kept)
+    return _label(best), " ".join(kept)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _strip_makes(text: str, makes: frozenset[str]) -> str:
+    if any(" " in make for make in makes):
+        return clean_spaces(_make_pattern(makes).sub(" ", text))
+    return " ".join(word for word in text.split() if word.lower() not in makes)
+
+
+@lru_cache(maxsize=256)
+def _make_pattern(makes: frozenset[str]) -> re.Pattern:
+    names = sorted(makes, key=len, reverse=True)
+    return re.compile(
+        r"(?<!\w)(?:" + "|".join(re.escape(name) for name in names) + r")(?!\w)",
+        re.IGNORECASE,
+    )
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class _KeywordAutomaton:
+    """
+    Aho-Corasick automaton over lowercased keywords: one pass over a text
+    reports every keyword occurrence, however many keywords there are.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        # lengths of the keywords ending in each state, own and via fail links
+        self._outputs: list[tuple[int, ...]] = [()]
+        self.longest = 0
+        for keyword in keywords:
+            if keyword:
+                self._add(keyword)
+        self._fail = self._link()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._outputs.append(())
+            state = following
+        self._outputs[state] += (len(keyword),)
+        self.longest = max(self.longest, len(keyword))
+
+    def _link(self) -> list[int]:
+        fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                fail[following] = target if target != following else 0
+                self._outputs[following] += self._outputs[fail[following]]
+        return fail
+
+    def leftmost_longest(self, text: str) -> Optional[tuple[str, int, int]]:
+        """(keyword, start, end) of the leftmost, longest whole-word keyword in ``text``."""
+        folded = text.lower()
+        if len(folded) != len(text):
+            # a few characters lowercase to several; keep offsets aligned
+            folded = "".join(char.lower()[0] for char in text)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        best: Optional[tuple[int, int]] = None
+        state = 0
+        for index, char in enumerate(folded):
+            if best is not None and index - self.longest >= best[0]:
+                # nothing that ends from here on can start at or before best
+                break
+            following = goto[state].get(char)
+            while following is None and state:
+                state = fail[state]
+                following = goto[state].get(char)
+            state = following or 0
+            if not outputs[state]:
+                continue
+            end = index + 1
+            for length in outputs[state]:
+                start = end - length
+                if start and _is_word_char(folded[start - 1]):
+                    continue
+                if end < len(folded) and _is_word_char(folded[end]):
+                    continue
+                if best is None or start < best[0] or (start == best[0] and end > best[1]):
+                    best = (start, end)
+        if best is None:
+            return None
+        return folded[best[0] : best[1]], best[0], best[1]
+
+
+class ColourMatcher:
+    """
+    Finds a colour name in free text, compiled once from a colour map such as
+    ``komsa_colour_map`` or ``sku_colour_map``.
+
+    Keys match case-insensitively on word boundaries, and the leftmost,
+    longest key wins ("space grau" before "grau"), so results do not depend
+    on the order of the map. Texts are scanned once with an Aho-Corasick
+    automaton rather than once per key.
+    """
+
+    def __init__(self, colour_map: dict[str, str]):
+        self.colours: dict[str, str] = {}
+        for key, colour in colour_map.items():
+            # the first spelling of a key wins, as in the original dict scan
+            self.colours.setdefault(key.lower(), colour)
+        self._automaton = _KeywordAutomaton(self.colours)
+        self._split = lru_cache(maxsize=PARSE_CACHE_SIZE)(self._split_uncached)
+
+    def find(self, text: str) -> Optional[tuple[str, int, int]]:
+        """(colour, start, end) of the first colour name in ``text``, or None."""
+        found = self._automaton.leftmost_longest(text)
+        if found is None:
+            return None
+        key, start, end = found
+        return self.colours[key], start, end
+
+    def split(self, text: Optional[str], default: str = UNKNOWN_COLOUR) -> tuple[str, str]:
+        """The colour found in ``text`` and the text with that colour name removed."""
+        return self._split(text or "", default)
+
+    def _split_uncached(self, text: str, default: str) -> tuple[str, str]:
+        found = self.find(text)
+        if found is None:
+            return default, clean_spaces(text)
+        colour, start, end = found
+        return colour, clean_spaces(text[:start] + " " + text[end:])
@@ -0,0 +1,192 @@
+import hashlib
+from typing import Iterable, Optional
+
+import db
+from config import get_settings
+from scrape_runs import (
+    RUN_MODE_DELTA,
+    RUN_MODE_FULL,
+    get_latest_completed_run,
+    get_run_chain,
+)
+
+
+settings = get_settings()
+
+# what identifies an offer; the price and stock of an offer are what change
+OFFER_IDENTITY_COLUMNS = [
+    "make",
+    "model",
+    "storage_capacity",
+    "grade",
+    "colour",
+    "partial_vat",
+]
+OFFER_COLUMNS = "scrape_id, source_id, make, model, storage_capacity, grade, colour, partial_vat, purchase_price, stock_count, offer_key, is_deleted"
+
+
+def offer_identity(row: dict) -> str:
+    values = [row.get("source_id")] + [row.get(column) for column in OFFER_IDENTITY_COLUMNS]
+    return "\x1f".join("" if value is None else str(value).strip().lower() for value in values)
+
+
+def offer_key(identity: str, occurrence: int = 0) -> str:
+    """
+    Fingerprint of an offer. A supplier can list the same identity more than
+    once in a scrape, so repeats are told apart by their position.
+    """
+    if occurrence:
+        identity = f"{identity}\x1f{occurrence}"
+    return hashlib.blake2b(identity.encode(), digest_size=12).hexdigest()
+
+
+def offer_state(row: dict) -> tuple:
+    price = row.get("purchase_price")
+    return (
+        None if price is None else round(float(price), 2),
+        int(row.get("stock_count") or 0),
+    )
+
+
+class OfferTracker:
+    """
+    Fingerprints every offer of one scrape_instance as it is normalized.
+
+    In delta mode it is given the previous snapshot of the source, drops
+    offers whose price and stock did not change and, once the scrape has
+    finished, produces tombstones for offers that disappeared.
+    """
+
+    def __init__(
+        self,
+        scrape_instance: str,
+        source_id: str,
+        previous: Optional[list[dict]] = None,
+        base_instance: Optional[str] = None,
+        parent_instance: Optional[str] = None,
+    ):
+        self.scrape_instance = str(scrape_instance)
+        self.source_id = source_id
+        self.mode = RUN_MODE_FULL if previous is None else RUN_MODE_DELTA
+        self.base_instance = base_instance
+        self.parent_instance = parent_instance
+        self._previous = {row["offer_key"]: row for row in previous or []}
+        self._occurrences: dict[str, int] = {}
+        self._seen: set[str] = set()
+        self.unchanged = 0
+
+    def admit(self, row: dict) -> bool:
+        """Keys the row and returns whether it needs to be written."""
+        identity = offer_identity(row)
+        occurrence = self._occurrences.get(identity, 0)
+        self._occurrences[identity] = occurrence + 1
+        key = offer_key(identity, occurrence)
+        row["offer_key"] = key
+        self._seen.add(key)
+        previous = self._previous.get(key)
+        if previous is not None and offer_state(previous) == offer_state(row):
+            self.unchanged += 1
+            return False
+        return True
+
+    def tombstones(self) -> list[dict]:
+        """Rows marking offers of the previous snapshot that were not seen again."""
+        return [
+            {
+                **{column: row.get(column) for column in OFFER_IDENTITY_COLUMNS},
+                "source_id": self.source_id,
+                "purchase_price": None,
+                "stock_count": 0,
+                "offer_key": key,
+                "is_deleted": True,
+                "scrape_instance": self.scrape_instance,
+            }
+            for key, row in self._previous.items()
+            if key not in self._seen
+        ]
+
+    @property
+    def snapshot_rows(self) -> int:
+        return len(self._seen)
+
+
+_trackers: dict[str, OfferTracker] = {}
+
+
+def register_tracker(tracker: OfferTracker):
+    _trackers[tracker.scrape_instance] = tracker
+
+
+def unregister_tracker(tracker: OfferTracker):
+    _trackers.pop(tracker.scrape_instance, None)
+
+
+def track_offers(rows: Iterable[dict]) -> list[dict]:
+    """Keys normalized rows and, for delta runs, keeps only the changed ones."""
+    kept = []
+    for row in rows:
+        tracker = _trackers.get(str(row.get("scrape_instance")))
+        if tracker is None or tracker.admit(row):
+            kept.append(row)
+    return kept
+
+
+async def create_offer_tracker(scrape_instance: str, source_id: str) -> OfferTracker:
+    """
+    Tracker for a new run. Delta mode is used when enabled and the latest
+    completed run of the source can serve as a parent; after
+    SCRAPE_DELTA_MAX_CHAIN deltas a full run starts a new base.
+    """
+    if not settings.SCRAPE_DELTA_MODE:
+        return OfferTracker(scrape_instance, source_id)
+    try:
+        parent = await get_latest_completed_run(source_id)
+        # runs recorded before delta mode have no mode and no offer keys
+        if parent is None or parent.get("mode") is None:
+            return OfferTracker(scrape_instance, source_id)
+        chain = await get_run_chain(parent["scrape_instance"])
+        if len(chain) > settings.SCRAPE_DELTA_MAX_CHAIN:
+            return OfferTracker(scrape_instance, source_id)
+        previous = await load_snapshot_from_chain(chain, OFFER_COLUMNS)
+    except Exception as e:
+        print(f"Could not load the previous snapshot for {source_id}, running a full scrape: {e}")
+        return OfferTracker(scrape_instance, source_id)
+    return OfferTracker(
+        scrape_instance,
+        source_id,
+        previous=previous,
+        base_instance=chain[0]["scrape_instance"],
+        parent_instance=parent["scrape_instance"],
+    )
+
+
+async def load_snapshot(scrape_instance: str, columns: str = OFFER_COLUMNS) -> list[dict]:
+    """Every offer of a scrape_instance, rebuilt from its base run and deltas."""
+    chain = await get_run_chain(scrape_instance)
+    if not chain:
+        # not recorded in scrape_runs (older scrapes): the instance is the snapshot
+        chain = [{"scrape_instance": str(scrape_instance)}]
+    return await load_snapshot_from_chain(chain, columns)
+
+
+async def load_snapshot_from_chain(chain: list[dict], columns: str) -> list[dict]:
+    selected = [column.strip() for column in columns.split(",")]
+    for column in ("scrape_id", "offer_key", "is_deleted"):
+        if "*" not in selected and column not in selected:
+            selected.append(column)
+
+    snapshot: dict[str, dict] = {}
+    for run in chain:
+        async for page in db.paginate(
+            "raw_product_scrapes",
+            ", ".join(selected),
+            filters={"scrape_instance": run["scrape_instance"]},
+            key="scrape_id",
+        ):
+            for row in page:
+                key = row.get("offer_key") or row["scrape_id"]
+                if row.get("is_deleted"):
+                    snapshot.pop(key, None)
+                else:
+                    snapshot[key] = row
+    return list(snapshot.values())
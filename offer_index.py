@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from lookup_cache import lookup_table_cache
+from offer_delta import load_snapshot
+from scrape_runs import get_latest_completed_run
+from sku import SkuEngine
+
+
+OFFER_INDEX_COLUMNS = "scrape_id, make, model, storage_capacity, grade, colour, partial_vat, purchase_price, stock_count"
+# what a (make, model, storage, grade, colour) query is matched on, besides the SKU
+OFFER_KEY_COLUMNS = ["make", "model", "storage_capacity", "grade", "colour"]
+
+
+def price_key(make, model, storage_capacity, grade, colour) -> tuple:
+    return tuple(
+        str(value or "").strip().lower()
+        for value in (make, model, storage_capacity, grade, colour)
+    )
+
+
+class SourceOffers:
+    """The offers of one source's latest completed scrape, grouped by SKU and sorted by price."""
+
+    def __init__(self, source: str, run: dict, by_sku: dict[str, list[dict]]):
+        self.source = source
+        self.scrape_instance = run["scrape_instance"]
+        self.finished_at = run.get("finished_at")
+        self.by_sku = by_sku
+        self.offers = sum(len(offers) for offers in by_sku.values())
+
+    def all(self) -> list[dict]:
+        return [offer for offers in self.by_sku.values() for offer in offers]
+
+    @classmethod
+    def build(cls, source: str, run: dict, rows: list[dict], engine: SkuEngine) -> "SourceOffers":
+        by_sku: dict[str, list[dict]] = {}
+        for row, sku in zip(rows, engine.generate_many(rows)):
+            if row.get("purchase_price") is None:
+                continue
+            offer = {column: row.get(column) for column in OFFER_KEY_COLUMNS}
+            offer.update(
+                source=source,
+                sku=sku,
+                purchase_price=float(row["purchase_price"]),
+                stock_count=int(row.get("stock_count") or 0),
+                partial_vat=row.get("partial_vat"),
+                scrape_instance=run["scrape_instance"],
+                key=price_key(*(row.get(column) for column in OFFER_KEY_COLUMNS)),
+            )
+            by_sku.setdefault(sku, []).append(offer)
+        for offers in by_sku.values():
+            offers.sort(key=lambda offer: offer["purchase_price"])
+        return cls(source, run, by_sku)
+
+    def cheapest(self, sku: str, key: Optional[tuple], in_stock: bool) -> Optional[dict]:
+        for offer in self.by_sku.get(sku, ()):
+            if in_stock and offer["stock_count"] <= 0:
+                continue
+            if key is not None and offer["key"] != key:
+                continue
+            return offer
+        return None
+
+
+class OfferIndex:
+    """
+    In-memory cheapest-offer lookup across the latest completed scrape of
+    every source, keyed by generated SKU.
+
+    Each source is rebuilt on its own when one of its scrapes completes, and
+    all of them when the SKU lookup table changes, so a lookup never touches
+    the database.
+    """
+
+    def __init__(self):
+        self.sources: dict[str, str] = {}  # source name -> source_id
+        self.version: Optional[str] = None  # lookup table version the SKUs were built with
+        self.built_at: Optional[float] = None
+        self._offers: dict[str, SourceOffers] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # awaited with (source_id, SourceOffers) whenever a source is (re)indexed
+        self.listeners: list[Callable[[str, SourceOffers], Awaitable[None]]] = []
+
+    async def warm(self, sources: dict[str, str]):
+        """Registers the sources and loads their latest scrapes in the background."""
+        self.sources = dict(sources)
+        self._rebuild_all_in_background()
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def scrape_completed(self, source_id: str):
+        """Schedules a rebuild of the source whose scrape has just completed."""
+        for source, known_id in self.sources.items():
+            if known_id == source_id:
+                self._spawn(self.refresh_source(source))
+
+    async def refresh_source(self, source: str) -> bool:
+        """Replaces one source's offers with its latest completed scrape."""
+        source_id = self.sources[source]
+        async with self._locks.setdefault(source, asyncio.Lock()):
+            try:
+                engine = await lookup_table_cache.get_engine()
+                if engine is None:
+                    return False
+                run = await get_latest_completed_run(source_id)
+                if run is None:
+                    self._offers.pop(source, None)
+                    return False
+                current = self._offers.get(source)
+                if (
+                    current is not None
+                    and current.scrape_instance == run["scrape_instance"]
+                    and self.version == lookup_table_cache.version
+                ):
+                    return True
+                rows = await load_snapshot(run["scrape_instance"], OFFER_INDEX_COLUMNS)
+                offers = await asyncio.to_thread(SourceOffers.build, source, run, rows, engine)
+            except Exception as e:
+                print(f"Could not index offers for {source}: {e}")
+                return False
+            self._offers[source] = offers
+            self.version = lookup_table_cache.version
+            self.built_at = time.time()
+        for listener in self.listeners:
+            try:
+                await listener(source_id, offers)
+            except Exception as e:
+                print(f"Offer index listener failed for {source}: {e}")
+        return True
+
+    async def rebuild(self):
+        await asyncio.gather(*(self.refresh_source(source) for source in self.sources))
+        # also when a source could not be loaded, so lookups do not retry on every call
+        self.version = lookup_table_cache.version
+
+    def best(
+        self, sku: str, key: Optional[tuple] = None, in_stock: bool = True
+    ) -> tuple[Optional[dict], int]:
+        """
+        Cheapest offer for ``sku`` across sources (optionally matching an exact
+        make/model/storage/grade/colour ``key``), and how many sources had one.
+        """
+        if lookup_table_cache.version != self.version:
+            # SKUs depend on the lookup table; keep serving while they are rebuilt
+            self._rebuild_all_in_background()
+        candidates = [
+            offer
+            for offers in self._offers.values()
+            if (offer := offers.cheapest(sku, key, in_stock)) is not None
+        ]
+        if not candidates:
+            return None, 0
+        return min(candidates, key=lambda offer: offer["purchase_price"]), len(candidates)
+
+    def status(self) -> dict:
+        return {
+            "version": self.version,
+            "built_at": self.built_at,
+            "sources": {
+                source: {
+                    "scrape_instance": offers.scrape_instance,
+                    "finished_at": offers.finished_at,
+                    "offers": offers.offers,
+                    "skus": len(offers.by_sku),
+                }
+                for source, offers in self._offers.items()
+            },
+        }
+
+    def _rebuild_all_in_background(self):
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = self._spawn(self.rebuild())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+offer_index = OfferIndex()
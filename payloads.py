@@ -0,0 +1,82 @@
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from typing import Any, Optional
+
+import db
+from config import get_settings
+
+
+settings = get_settings()
+
+
+def _clean(value: Any) -> Any:
+    # NaN and infinity (e.g. empty Excel cells) are not valid JSON for jsonb
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, dict):
+        return {str(key): _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    return value
+
+
+def canonical_payload(line: dict) -> str:
+    """Stable JSON for a supplier item, so identical items hash identically."""
+    return json.dumps(_clean(line), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def payload_hash(encoded: str) -> str:
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class PayloadStore:
+    """
+    Content-addressed store for the raw supplier item behind each scraped row.
+
+    ``add`` returns the item's hash, which the row keeps in ``payload_hash``.
+    Each distinct item is written once to ``scrape_payloads``: repeats within
+    a scrape (e.g. one Compa product per grade) and items already stored by
+    an earlier scrape are skipped, using an in-process set of recent hashes
+    and ``on conflict do nothing`` for the rest.
+    """
+
+    def __init__(self, table: str = "scrape_payloads", known_size: Optional[int] = None):
+        self.table = table
+        self.known_size = known_size or settings.PAYLOAD_KNOWN_HASHES
+        self._known: OrderedDict[str, None] = OrderedDict()
+        self._pending: dict[str, dict] = {}
+
+    def add(self, line: dict, source_id: Optional[str] = None) -> str:
+        encoded = canonical_payload(line)
+        key = payload_hash(encoded)
+        if key in self._known:
+            self._known.move_to_end(key)
+        elif key not in self._pending:
+            self._pending[key] = {
+                "payload_hash": key,
+                "source_id": source_id,
+                "payload": json.loads(encoded),
+            }
+        return key
+
+    async def flush(self):
+        """Writes the payloads added since the last flush."""
+        if not self._pending:
+            return
+        pending = list(self._pending.values())
+        self._pending = {}
+        try:
+            await db.upsert(self.table, pending, on_conflict="payload_hash", ignore_duplicates=True)
+        except Exception as e:
+            # rows keep their hash; the payload is written the next time it is seen
+            print(f"Could not store {len(pending)} scrape payloads: {e}")
+            return
+        for row in pending:
+            self._known[row["payload_hash"]] = None
+        while len(self._known) > self.known_size:
+            self._known.popitem(last=False)
+
+
+payload_store = PayloadStore()
@@ -0,0 +1,83 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Optional
+
+from bulk_writer import BulkWriter
+from config import get_settings
+from job_queue import current_progress
+from offer_delta import track_offers
+from payloads import payload_store
+
+
+settings = get_settings()
+
+_DONE = object()
+
+
+async def iter_batches(items: Iterable, size: int) -> AsyncIterator[list]:
+    """Slices an in-memory iterable into lists of ``size`` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+            # let in-flight inserts make progress between batches
+            await asyncio.sleep(0)
+    if batch:
+        yield batch
+
+
+async def iter_dataframe_slices(df, size: int) -> AsyncIterator:
+    """Yields a DataFrame in slices of ``size`` rows, for column-wise normalizers."""
+    for start in range(0, len(df), size):
+        yield df.iloc[start : start + size]
+        await asyncio.sleep(0)
+
+
+async def run_pipeline(
+    batches: AsyncIterable[list],
+    normalize: Callable[[list], Iterable[dict]],
+    writer: Optional[BulkWriter] = None,
+    prefetch: Optional[int] = None,
+) -> dict:
+    """
+    Streams supplier batches (pages, sheet slices) through ``normalize`` into the
+    bulk writer. Fetching runs ahead of normalizing by at most ``prefetch``
+    batches, so memory stays bounded by a few pages no matter the catalog size
+    and the first chunks are written while later pages are still downloading.
+    """
+    writer = writer or BulkWriter()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch or settings.PIPELINE_PREFETCH)
+
+    async def produce():
+        try:
+            async for batch in batches:
+                await queue.put(batch)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+
+    progress = current_progress()
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            rows = list(normalize(batch))
+            if progress is not None:
+                progress.pages_fetched += 1
+                progress.rows_normalized += len(rows)
+            # store the raw items these rows reference before the rows themselves
+            await payload_store.flush()
+            # offers are keyed here; delta runs drop the unchanged ones
+            await writer.add(track_offers(rows))
+    finally:
+        if not producer.done():
+            producer.cancel()
+        # rows already buffered are still written if the fetch failed part way
+        await writer.flush()
+
+    return writer.report()
@@ -0,0 +1,210 @@
+import asyncio
+import datetime
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import db
+from config import get_settings
+
+
+settings = get_settings()
+
+ROLLUP_COLUMNS = "day, sku, source_id, scrape_instance, min_price, median_price, max_price, offers, stock_count"
+ARCHIVE_PARTITIONING = ds.partitioning(
+    pa.schema([("day", pa.string()), ("source_id", pa.string())]), flavor="hive"
+)
+
+
+def scrape_day(finished_at: Optional[str]) -> str:
+    """UTC calendar day of a scrape_runs timestamp, as YYYY-MM-DD."""
+    if not finished_at:
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    moment = datetime.datetime.fromisoformat(finished_at)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.date().isoformat()
+
+
+def offer_frame(offers: list[dict]) -> pd.DataFrame:
+    """The per-offer columns kept in the archive: sku, purchase_price, stock_count."""
+    return pd.DataFrame(
+        {
+            "sku": pd.Series([offer["sku"] for offer in offers], dtype="string"),
+            "purchase_price": pd.Series(
+                [offer["purchase_price"] for offer in offers], dtype="float64"
+            ),
+            "stock_count": pd.Series(
+                [offer["stock_count"] for offer in offers], dtype="int64"
+            ),
+        }
+    )
+
+
+def rollup_rows(
+    frame: pd.DataFrame, day: str, source_id: str, scrape_instance: str
+) -> list[dict]:
+    """One price_rollups row per SKU: min/median/max price, offer count and stock."""
+    if frame.empty:
+        return []
+    stats = frame.groupby("sku").agg(
+        min_price=("purchase_price", "min"),
+        median_price=("purchase_price", "median"),
+        max_price=("purchase_price", "max"),
+        offers=("purchase_price", "size"),
+        stock_count=("stock_count", "sum"),
+    )
+    stats = stats.round({"min_price": 2, "median_price": 2, "max_price": 2}).reset_index()
+    stats = stats.assign(day=day, source_id=source_id, scrape_instance=str(scrape_instance))
+    return stats.astype(object).to_dict(orient="records")
+
+
+class PriceArchive:
+    """
+    Local Parquet archive of every offer price, partitioned by day and
+    source_id. A source keeps one file per day, so the last scrape of the
+    day is the one on record, as in price_rollups.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or settings.PRICE_ARCHIVE_PATH)
+
+    def write(self, frame: pd.DataFrame, day: str, source_id: str):
+        directory = self.path / f"day={day}" / f"source_id={source_id}"
+        directory.mkdir(parents=True, exist_ok=True)
+        # dot-prefixed, so readers never pick up a half-written file
+        tmp_path = directory / ".offers.parquet.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        tmp_path.replace(directory / "offers.parquet")
+
+    def read(
+        self, sku: str, start: str, end: str, source_id: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Offers of ``sku`` between the ``start`` and ``end`` days (inclusive)."""
+        columns = ["day", "source_id", "sku", "purchase_price", "stock_count"]
+        if not self.path.exists():
+            return pd.DataFrame(columns=columns)
+        dataset = ds.dataset(
+            self.path,
+            format="parquet",
+            partitioning=ARCHIVE_PARTITIONING,
+        )
+        condition = (
+            (ds.field("day") >= start) & (ds.field("day") <= end) & (ds.field("sku") == sku)
+        )
+        if source_id is not None:
+            condition = condition & (ds.field("source_id") == source_id)
+        return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def daily_stats(offers: pd.DataFrame) -> list[dict]:
+    """min/median/max price per day over every archived offer of that day."""
+    if offers.empty:
+        return []
+    stats = offers.groupby("day").agg(
+        min=("purchase_price", "min"),
+        median=("purchase_price", "median"),
+        max=("purchase_price", "max"),
+        offers=("purchase_price", "size"),
+        sources=("source_id", "nunique"),
+    )
+    stats = stats.round({"min": 2, "median": 2, "max": 2}).reset_index()
+    return stats.astype(object).to_dict(orient="records")
+
+
+def daily_stats_from_rollups(rollups: list[dict]) -> list[dict]:
+    """
+    The same per-day figures from price_rollups, for days missing from the
+    local archive. Min and max are exact; with several sources the median
+    is the median of the source medians.
+    """
+    if not rollups:
+        return []
+    frame = pd.DataFrame(rollups)
+    for column in ("min_price", "median_price", "max_price"):
+        frame[column] = pd.to_numeric(frame[column])
+    stats = frame.groupby("day").agg(
+        min=("min_price", "min"),
+        median=("median_price", "median"),
+        max=("max_price", "max"),
+        offers=("offers", "sum"),
+        sources=("source_id", "nunique"),
+    )
+    stats = stats.round({"min": 2, "median": 2, "max": 2}).reset_index()
+    return stats.astype(object).to_dict(orient="records")
+
+
+class PriceHistory:
+    """
+    Records the price of every SKU per source and day when a scrape is
+    indexed, in the price_rollups table and the local Parquet archive, and
+    answers per-day trend queries from them without touching raw rows.
+    """
+
+    def __init__(self, archive: Optional[PriceArchive] = None):
+        self.archive = archive or PriceArchive()
+
+    async def record(self, source_id: str, scrape_instance: str, finished_at: Optional[str], offers: list[dict]):
+        day = scrape_day(finished_at)
+        frame = offer_frame(offers)
+        try:
+            await asyncio.to_thread(self.archive.write, frame, day, source_id)
+        except Exception as e:
+            print(f"Could not archive prices of {scrape_instance}: {e}")
+        rows = rollup_rows(frame, day, source_id, scrape_instance)
+        for start in range(0, len(rows), settings.INSERT_CHUNK_ROWS):
+            await db.upsert(
+                "price_rollups",
+                rows[start : start + settings.INSERT_CHUNK_ROWS],
+                on_conflict="sku,source_id,day",
+            )
+
+    async def daily(
+        self,
+        sku: str,
+        start: str,
+        end: str,
+        source_ids: list[str],
+    ) -> list[dict]:
+        """
+        Per-day min/median/max for ``sku``. A day is computed from the
+        archived offers when the archive holds every source the rollups have
+        for it, and from the rollups otherwise (e.g. on a fresh host).
+        """
+        # one query per source keeps each well under the PostgREST row limit
+        results = await asyncio.gather(
+            *(
+                db.select(
+                    "price_rollups",
+                    ROLLUP_COLUMNS,
+                    filters={"sku": sku, "source_id": source_id},
+                    between={"day": (start, end)},
+                )
+                for source_id in source_ids
+            )
+        )
+        rollups = [row for rows in results for row in rows]
+        offers = await asyncio.to_thread(
+            self.archive.read, sku, start, end, source_ids[0] if len(source_ids) == 1 else None
+        )
+        offers = offers[offers["source_id"].isin(source_ids)]
+
+        archived: dict[str, set] = {}
+        for day, source_id in zip(offers["day"], offers["source_id"]):
+            archived.setdefault(day, set()).add(source_id)
+        missing = [
+            row for row in rollups if row["source_id"] not in archived.get(row["day"], set())
+        ]
+        fallback_days = {row["day"] for row in missing}
+
+        days = [entry for entry in daily_stats(offers) if entry["day"] not in fallback_days]
+        days.extend(
+            daily_stats_from_rollups([row for row in rollups if row["day"] in fallback_days])
+        )
+        return sorted(days, key=lambda entry: entry["day"])
+
+
+price_history = PriceHistory()
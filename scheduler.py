@@ -0,0 +1,123 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+
+@dataclass
+class ScrapeJob:
+    """A single unit of scrape work, e.g. one Foxway manufacturer/VAT combination."""
+
+    supplier: str
+    name: str
+    scrape_instance: str
+    run: Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class ScrapeJobResult:
+    supplier: str
+    name: str
+    scrape_instance: str
+    ok: bool
+    duration_s: float
+    result: Any = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ScrapeScheduler:
+    """
+    Fans scrape jobs out as asyncio tasks, limiting how many jobs per supplier
+    run at the same time so a single supplier API is never hammered.
+    """
+
+    default_concurrency: int = 3
+    supplier_concurrency: dict[str, int] = field(default_factory=dict)
+    jobs: list[ScrapeJob] = field(default_factory=list)
+
+    def add(self, job: ScrapeJob):
+        self.jobs.append(job)
+
+    def extend(self, jobs: list[ScrapeJob]):
+        self.jobs.extend(jobs)
+
+    def _limit_for(self, supplier: str) -> int:
+        limits = {key.lower(): value for key, value in self.supplier_concurrency.items()}
+        limit = limits.get(supplier.lower(), self.default_concurrency)
+        return max(1, limit)
+
+    async def _run_job(
+        self, job: ScrapeJob, semaphore: asyncio.Semaphore
+    ) -> ScrapeJobResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await job.run()
+                return ScrapeJobResult(
+                    supplier=job.supplier,
+                    name=job.name,
+                    scrape_instance=job.scrape_instance,
+                    ok=True,
+                    duration_s=time.perf_counter() - started,
+                    result=result,
+                )
+            except Exception as e:
+                print(f"Scrape job {job.name} failed: {e}")
+                return ScrapeJobResult(
+                    supplier=job.supplier,
+                    name=job.name,
+                    scrape_instance=job.scrape_instance,
+                    ok=False,
+                    duration_s=time.perf_counter() - started,
+                    error=f"{type(e).__name__}: {e}",
+                )
+
+    async def run(self) -> list[ScrapeJobResult]:
+        """Runs every queued job and returns one result per job, in queue order."""
+        semaphores = {
+            supplier: asyncio.Semaphore(self._limit_for(supplier))
+            for supplier in {job.supplier for job in self.jobs}
+        }
+        tasks = [
+            asyncio.create_task(self._run_job(job, semaphores[job.supplier]))
+            for job in self.jobs
+        ]
+        return list(await asyncio.gather(*tasks))
+
+
+def summarise_results(results: list[ScrapeJobResult]) -> dict:
+    """Groups job results into a run summary keyed by scrape_instance."""
+    summary = {}
+    for result in results:
+        entry = summary.setdefault(
+            result.scrape_instance,
+            {
+                "supplier": result.supplier,
+                "jobs": 0,
+                "succeeded": 0,
+                "failed": 0,
+                "slowest_job_s": 0.0,
+                "rows_written": 0,
+                "rows_failed": 0,
+                "results": [],
+                "failures": [],
+            },
+        )
+        entry["jobs"] += 1
+        entry["slowest_job_s"] = max(
+            entry["slowest_job_s"], round(result.duration_s, 3)
+        )
+        if isinstance(result.result, dict):
+            # scrapers report their bulk insert stats
+            entry["rows_written"] += result.result.get("rows_written", 0)
+            entry["rows_failed"] += result.result.get("rows_failed", 0)
+        if result.ok:
+            entry["succeeded"] += 1
+            entry["results"].append(
+                {"job": result.name, "duration_s": round(result.duration_s, 3)}
+            )
+        else:
+            entry["failed"] += 1
+            entry["failures"].append({"job": result.name, "error": result.error})
+    return summary
@@ -26,12 +26,28 @@ create table public.raw_product_scrapes (
   stock_count integer null,
   meta_data text null,
   scrape_instance uuid null,
+  payload_hash text null,
+  offer_key text null,
+  is_deleted boolean not null default false,
   constraint raw_product_scrapes_pkey primary key (scrape_id),
   constraint raw_product_scrapes_source_id_fkey foreign KEY (source_id) references sources (source_id) on delete RESTRICT
 ) TABLESPACE pg_default;
 
 create index IF not exists idx_scrape_instance on public.raw_product_scrapes using btree (scrape_instance) TABLESPACE pg_default;
 
+-- keyset pagination of a scrape instance ordered by scrape_id
+create index IF not exists idx_scrape_instance_scrape_id on public.raw_product_scrapes using btree (scrape_instance, scrape_id) TABLESPACE pg_default;
+
+-- raw supplier items, stored once per distinct content and referenced from
+-- raw_product_scrapes.payload_hash (meta_data is only set on older rows)
+create table public.scrape_payloads (
+  payload_hash text not null,
+  source_id uuid null,
+  payload jsonb not null,
+  created_at timestamp with time zone not null default now(),
+  constraint scrape_payloads_pkey primary key (payload_hash)
+) TABLESPACE pg_default;
+
 create table public.sources (
   source_id uuid not null default gen_random_uuid (),
   source_base_url text not null,
@@ -40,4 +56,59 @@ create table public.sources (
   source_description text null,
   constraint sources_pkey primary key (source_id),
   constraint sources_source_base_url_key unique (source_base_url)
-) TABLESPACE pg_default;
\ No newline at end of file
+) TABLESPACE pg_default;
+
+-- one row per scrape_instance, written by every scraper; downloads only serve completed runs
+create table public.scrape_runs (
+  scrape_instance uuid not null,
+  source_id uuid not null,
+  started_at timestamp with time zone not null default now(),
+  finished_at timestamp with time zone null,
+  row_count integer null,
+  status text not null default 'running',
+  mode text null,
+  base_instance uuid null,
+  parent_instance uuid null,
+  constraint scrape_runs_pkey primary key (scrape_instance),
+  constraint scrape_runs_source_id_fkey foreign KEY (source_id) references sources (source_id) on delete RESTRICT,
+  constraint scrape_runs_status_check check (status in ('running', 'completed', 'failed')),
+  constraint scrape_runs_mode_check check (mode in ('full', 'delta'))
+) TABLESPACE pg_default;
+
+-- "latest completed scrape for source X" is a single index lookup
+create index IF not exists idx_scrape_runs_latest_completed on public.scrape_runs using btree (source_id, finished_at desc) TABLESPACE pg_default
+where
+  (status = 'completed');
+
+-- delta runs of a base, walked to rebuild a snapshot
+create index IF not exists idx_scrape_runs_base_instance on public.scrape_runs using btree (base_instance) TABLESPACE pg_default
+where
+  (base_instance is not null);
+
+-- per-day price summary of every SKU per source, from the last completed scrape of the day
+create table public.price_rollups (
+  day date not null,
+  sku text not null,
+  source_id uuid not null,
+  scrape_instance uuid not null,
+  min_price numeric(10, 2) not null,
+  median_price numeric(10, 2) not null,
+  max_price numeric(10, 2) not null,
+  offers integer not null,
+  stock_count integer not null,
+  constraint price_rollups_pkey primary key (sku, source_id, day),
+  constraint price_rollups_source_id_fkey foreign KEY (source_id) references sources (source_id) on delete RESTRICT
+) TABLESPACE pg_default;
+
+-- delta mode migration for existing databases
+-- alter table public.raw_product_scrapes add column offer_key text null, add column is_deleted boolean not null default false;
+-- alter table public.scrape_runs add column mode text null, add column base_instance uuid null, add column parent_instance uuid null;
+-- alter table public.scrape_runs add constraint scrape_runs_mode_check check (mode in ('full', 'delta'));
+
+-- payload dedup migration for existing databases
+-- alter table public.raw_product_scrapes add column payload_hash text null;
+
+-- one-off backfill for scrapes taken before scrape_runs existed
+-- insert into public.scrape_runs (scrape_instance, source_id, started_at, finished_at, row_count, status)
+-- select scrape_instance, min(source_id::text)::uuid, min(entry_date), max(entry_date), count(*), 'completed'
+-- from public.raw_product_scrapes where scrape_instance is not null group by scrape_instance;
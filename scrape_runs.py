@@ -0,0 +1,114 @@
+import datetime
+from typing import Optional
+
+import db
+
+
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+
+# a full run stores every offer; a delta run only stores offers that changed
+# since parent_instance, plus tombstones, on top of the full base_instance
+RUN_MODE_FULL = "full"
+RUN_MODE_DELTA = "delta"
+
+RUN_COLUMNS = "scrape_instance, source_id, started_at, finished_at, row_count, status, mode, base_instance, parent_instance"
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+async def start_scrape_run(
+    scrape_instance: str,
+    source_id: str,
+    mode: str = RUN_MODE_FULL,
+    base_instance: Optional[str] = None,
+    parent_instance: Optional[str] = None,
+):
+    await db.insert(
+        "scrape_runs",
+        {
+            "scrape_instance": str(scrape_instance),
+            "source_id": source_id,
+            "started_at": _now(),
+            "status": RUN_RUNNING,
+            "mode": mode,
+            "base_instance": base_instance,
+            "parent_instance": parent_instance,
+        },
+    )
+
+
+async def finish_scrape_run(scrape_instance: str, status: str, row_count: int):
+    await db.update(
+        "scrape_runs",
+        {"finished_at": _now(), "status": status, "row_count": row_count},
+        filters={"scrape_instance": str(scrape_instance)},
+    )
+
+
+def run_status(summary_entry: dict) -> str:
+    """
+    A run only counts as completed if every job succeeded and wrote at least
+    one row. A delta run may write nothing when no offer changed, so for it
+    unchanged offers count too.
+    """
+    if summary_entry["failed"] or summary_entry["rows_failed"]:
+        return RUN_FAILED
+    if not summary_entry["rows_written"] and not summary_entry.get("offers_unchanged"):
+        return RUN_FAILED
+    return RUN_COMPLETED
+
+
+async def get_latest_completed_run(source_id: str) -> Optional[dict]:
+    """Most recent completed run for a source, served by idx_scrape_runs_latest_completed."""
+    runs = await db.select(
+        "scrape_runs",
+        RUN_COLUMNS,
+        filters={"source_id": source_id, "status": RUN_COMPLETED},
+        order_by="finished_at",
+        desc=True,
+        limit=1,
+    )
+    return runs[0] if runs else None
+
+
+async def get_scrape_run(scrape_instance: str) -> Optional[dict]:
+    runs = await db.select(
+        "scrape_runs", RUN_COLUMNS, filters={"scrape_instance": str(scrape_instance)}
+    )
+    return runs[0] if runs else None
+
+
+async def get_run_chain(scrape_instance: str) -> list[dict]:
+    """
+    Runs needed to rebuild the snapshot of ``scrape_instance``: its full base
+    run first, then every delta run in order up to and including it.
+    """
+    run = await get_scrape_run(scrape_instance)
+    if run is None:
+        return []
+    base_instance = run.get("base_instance")
+    if not base_instance:
+        return [run]
+
+    deltas = await db.select(
+        "scrape_runs", RUN_COLUMNS, filters={"base_instance": base_instance}
+    )
+    by_instance = {delta["scrape_instance"]: delta for delta in deltas}
+    chain = [run]
+    while chain[-1].get("parent_instance") not in (None, base_instance):
+        parent = by_instance.get(chain[-1]["parent_instance"])
+        if parent is None:
+            raise ValueError(
+                f"Scrape run {chain[-1]['parent_instance']} missing from the chain of {scrape_instance}"
+            )
+        chain.append(parent)
+    base = await get_scrape_run(base_instance)
+    if base is None:
+        raise ValueError(f"Base scrape run {base_instance} of {scrape_instance} is missing")
+    chain.append(base)
+    chain.reverse()
+    return chain
@@ -0,0 +1,168 @@
+"""
+Compares the shared normalize.py extractors with the per-supplier storage,
+make and colour parsing they replaced, and reports rows/sec.
+
+Run from the repo root:
+    python scripts/benchmark_normalize.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from maps import komsa_colour_map  # noqa: E402
+from normalize import (  # noqa: E402
+    ColourMatcher,
+    UNKNOWN_STORAGE,
+    make_set,
+    split_product_name,
+)
+
+
+SIZES = ["128GB", "64GB", "32GB", "256GB", "512GB", "16GB", "8GB", "4GB", "2GB", "1TB", "2TB", "4TB"]
+MAKES = ["Apple", "Samsung", "Huawei"]
+
+
+def legacy_foxway(name):
+    storage = next((size for size in SIZES if size in name), "Unknown Storage")
+    model = name
+    for size in SIZES:
+        model = model.replace(size, "").strip()
+    for make in MAKES:
+        model = model.replace(make, "").strip()
+    return storage, model
+
+
+def legacy_komsa(description):
+    manufacturer = description.split()[0].lower()
+    model = description.lower().replace(manufacturer, "").strip()
+    matches = [size for size in [" " + size.lower() for size in SIZES] if size in model]
+    storage = "Unknown Storage"
+    if len(matches) == 1:
+        storage = matches[0]
+        model = model.replace(storage, "").strip()
+    colour = "Unknown"
+    for key, simple_colour in komsa_colour_map().items():
+        if key.lower() in model:
+            colour = simple_colour
+            model = model.replace(key, "").strip()
+            break
+    return storage, model, colour
+
+
+def legacy_dipli(name, brand):
+    storage = "Unknown Storage"
+    for size in SIZES[:9] + SIZES[9:] + ["128", "64", "32", "256", "512", "16", "8", "4", "2"]:
+        if size in name:
+            storage = size if "GB" in size or "TB" in size else f"{size}GB"
+            break
+    model = name.replace(brand, "").strip()
+    if storage != "Unknown Storage":
+        for variant in [storage, storage.replace("GB", "").replace("TB", "")]:
+            model = model.replace(variant, "").strip()
+    return storage, model
+
+
+KOMSA_COLOURS = ColourMatcher(komsa_colour_map())
+
+
+FOXWAY_MAKES = make_set(MAKES)
+
+
+def shared_foxway(name):
+    return split_product_name(name, FOXWAY_MAKES)
+
+
+def shared_komsa(description):
+    manufacturer = description.split()[0].lower()
+    storage, model = split_product_name(description.lower(), [manufacturer])
+    colour, model = KOMSA_COLOURS.split(model)
+    return storage, model, colour
+
+
+def shared_dipli(name, brand):
+    return split_product_name(name, [brand], bare_numbers=True)
+
+
+def make_names(n):
+    colours = list(komsa_colour_map()) + ["phantom", ""]
+    names = []
+    for _ in range(n):
+        make = random.choice(MAKES)
+        model = random.choice(["iPhone", "iPhone Pro Max", "Galaxy S", "Galaxy A", "P"])
+        model = f"{model} {random.randint(1, 999)}"
+        size = random.choice(SIZES[:9] + ["1TB", ""])
+        names.append((make, f"{make} {model} {size} {random.choice(colours)}".strip()))
+    return names
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>12,.0f} rows/sec"
+
+
+def bench(label, func, args):
+    started = time.perf_counter()
+    results = [func(*a) for a in args]
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28}{rate(len(args), elapsed)}")
+    return results
+
+
+def main():
+    random.seed(11)
+    for label, names in (
+        ("mostly distinct", make_names(50_000)),
+        # real catalogs repeat each name per grade / VAT mode / scrape
+        ("each repeated 8x", make_names(6_250) * 8),
+    ):
+        print(f"{len(names):,} product names, {label}")
+        compare(names)
+    compare_colour_scan(make_names(50_000))
+
+
+def compare(names):
+    old = bench("foxway legacy", legacy_foxway, [(name,) for _, name in names])
+    new = bench("foxway shared", shared_foxway, [(name,) for _, name in names])
+    print(f"    storage agrees on {agreement(old, new, 0):.1%}")
+
+    old = bench("komsa legacy", legacy_komsa, [(name,) for _, name in names])
+    new = bench("komsa shared", shared_komsa, [(name,) for _, name in names])
+    print(f"    storage agrees on {agreement(old, new, 0, strip=True):.1%}, colour on {agreement(old, new, 2):.1%}")
+
+    old = bench("dipli legacy", legacy_dipli, [(name, make) for make, name in names])
+    new = bench("dipli shared", shared_dipli, [(name, make) for make, name in names])
+    print(f"    storage agrees on {agreement(old, new, 0):.1%}")
+
+
+def compare_colour_scan(names):
+    """Colour lookup alone, without memoization: per-key scan vs one automaton pass."""
+    def per_key(text):
+        # as parse_komsa_info did: the map was rebuilt for every row
+        for key, colour in komsa_colour_map().items():
+            if key.lower() in text:
+                return colour
+        return None
+
+    def automaton(text):
+        found = KOMSA_COLOURS.find(text)
+        return None if found is None else found[0]
+
+    print(f"{len(names):,} descriptions, colour scan only")
+    texts = [(name.lower(),) for _, name in names]
+    old = bench("per-key substring scan", per_key, texts)
+    new = bench("aho-corasick automaton", automaton, texts)
+    print(f"    colour agrees on {sum(a == b for a, b in zip(old, new)) / len(old):.1%}")
+
+
+def agreement(old, new, index, strip=False):
+    def value(result):
+        v = result[index]
+        return v.strip().upper() if strip and v != UNKNOWN_STORAGE else v
+
+    return sum(value(a) == value(b) for a, b in zip(old, new)) / len(old)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Checks that the batch SKU paths match generate_sku and reports rows/sec.
+
+Run from the repo root:
+    python scripts/benchmark_sku.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from maps import sku_colour_map, sku_grade_map  # noqa: E402
+from sku import SkuEngine, generate_sku  # noqa: E402
+
+
+def make_lookup_table(n_models=400):
+    table = [["make", "model", "code"]]
+    for i in range(n_models):
+        make = random.choice(["Apple", "Samsung", "Huawei"])
+        table.append([make, f"Model {i}", f"MC{i:04d}"])
+    return table
+
+
+def make_devices(n, model_codes):
+    colours = list(sku_colour_map()) + ["Unknown", "  black ", None]
+    grades = list(sku_grade_map()) + ["Excellent", None]
+    storages = ["64GB", "128GB", "256gb", "1TB", "Unknown Storage", None]
+    devices = []
+    for _ in range(n):
+        make, model, _code = random.choice(model_codes[1:])
+        if random.random() < 0.1:
+            model = "Not In Sheet"
+        devices.append(
+            {
+                "make": make,
+                "model": model,
+                "storage_capacity": random.choice(storages),
+                "colour": random.choice(colours),
+                "grade": random.choice(grades),
+            }
+        )
+    return devices
+
+
+def legacy(devices, model_codes):
+    return [
+        generate_sku(
+            d["make"], d["model"], d["storage_capacity"], d["colour"], d["grade"], model_codes
+        )
+        for d in devices
+    ]
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>12,.0f} rows/sec"
+
+
+def main():
+    random.seed(7)
+    model_codes = make_lookup_table()
+
+    for n in (10_000, 100_000):
+        devices = make_devices(n, model_codes)
+        frame = pd.DataFrame(devices, dtype=object)
+
+        # the per-row reference is slow, so time it on a sample
+        sample = devices[:10_000]
+        started = time.perf_counter()
+        expected = legacy(sample, model_codes)
+        legacy_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        engine = SkuEngine(model_codes)
+        per_row = engine.generate_many(devices)
+        engine_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        engine = SkuEngine(model_codes)
+        vectorized = engine.generate_frame(frame).tolist()
+        frame_s = time.perf_counter() - started
+
+        assert per_row[: len(sample)] == expected, "SkuEngine.generate_many differs from generate_sku"
+        assert vectorized == per_row, "SkuEngine.generate_frame differs from generate_sku"
+
+        print(f"{n:,} devices (parity ok)")
+        print(f"  generate_sku (per row)      {rate(len(sample), legacy_s)}")
+        print(f"  SkuEngine.generate_many     {rate(n, engine_s)}")
+        print(f"  SkuEngine.generate_frame    {rate(n, frame_s)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares batch validation of normalized rows (models.validate_scrape_rows)
+with the per-row RawProductScrape + dict() path it replaced, and reports
+rows/sec.
+
+Run from the repo root:
+    python scripts/benchmark_validation.py
+"""
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import RawProductScrape, validate_scrape_rows  # noqa: E402
+
+
+def make_rows(n):
+    return [
+        {
+            "source_id": "4f0c3a52-54a5-4b3e-9d8f-2d3f1f0c9b11",
+            "make": random.choice(["apple", "samsung"]),
+            "model": f"iphone {random.randint(8, 16)}",
+            "storage_capacity": random.choice(["64gb", "128GB", "1tb", "Unknown Storage"]),
+            "grade": random.choice(["A", "B", "C"]),
+            "colour": random.choice(["Black", "Blue", "Unknown"]),
+            "ce_mark": None,
+            "partial_vat": False,
+            "purchase_price": round(random.uniform(50, 900), 2),
+            "trade_in_price": None,
+            "stock_count": random.randint(0, 50),
+            "payload_hash": f"{random.getrandbits(128):032x}",
+            "scrape_instance": "0b9d5c1e-7d7a-4bb4-8f1a-5b0a9c7f4e21",
+        }
+        for _ in range(n)
+    ]
+
+
+def legacy(rows):
+    # RawProductScrape per row, then create_db_row's dict() and upper()
+    out = []
+    for row in rows:
+        data = RawProductScrape(**row).dict()
+        data["storage_capacity"] = data["storage_capacity"].upper()
+        out.append(data)
+    return out
+
+
+def batch(rows, size=500):
+    # the scrapers validate one pipeline batch at a time
+    out = []
+    for start in range(0, len(rows), size):
+        out.extend(validate_scrape_rows(rows[start : start + size])[0])
+    return out
+
+
+def bench(label, func, rows):
+    started = time.perf_counter()
+    result = func(rows)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28}{len(rows) / elapsed:>12,.0f} rows/sec")
+    return result
+
+
+def main():
+    random.seed(7)
+    warnings.simplefilter("ignore", DeprecationWarning)
+    rows = make_rows(50_000)
+    print(f"{len(rows):,} normalized rows")
+    old = bench("per-row model + dict()", legacy, rows)
+    new = bench("batch TypeAdapter", batch, rows)
+    print(f"    identical output: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from maps import sku_colour_map, sku_grade_map
+
+
+SKU_LENGTH = 15
+SKU_PREFIX = "M-"
+UNKNOWN_MODEL_CODE = "XXXXXX"
+# distinct (make, model, storage, colour, grade) keys memoized per SkuEngine
+SKU_CACHE_SIZE = 65_536
+
+_CAPACITY_DIGITS = re.compile(r"(\d+)")
+
+
+# Placeholder for a more robust model code generation/lookup
+# This will be the most complex part to get right and will need your detailed rules/mappings
+def get_model_code(make: str, model_name: str, model_codes: list) -> str:
+
+    make_lower = make.lower()
+    model_lower = model_name.lower()
+
+    for line in model_codes:
+        if line[0].lower() == make_lower:
+            if line[1].lower() == model_lower:
+                return line[2]
+
+    return UNKNOWN_MODEL_CODE
+
+
+def generate_sku(
+    make: str,
+    model_name: str,
+    storage_capacity: str,
+    colour: str,
+    grade: str,
+    model_codes: list,
+) -> str:
+    colour_code_map = sku_colour_map()
+
+    grade_code_map = sku_grade_map()
+
+    # 1. Get Model Code
+    raw_model_code = get_model_code(
+        make if make else "", model_name if model_name else "", model_codes
+    )
+
+    # 2. Determine Capacity Code
+    cap_code = ""
+    storage_input_str = str(
+        storage_capacity if storage_capacity else ""
+    ).upper()  # Normalize input
+    if "TB" in storage_input_str:
+        num_match = re.search(r"(\d+)", storage_input_str)
+        cap_code = num_match.group(1) if num_match else "X"  # e.g. "1" for 1TB
+    elif "GB" in storage_input_str:
+        num_match = re.search(r"(\d+)", storage_input_str)
+        cap_code = num_match.group(1) if num_match else "XXX"  # e.g. "64", "128"
+    if not cap_code:  # If still empty (e.g. input was just "Unknown Storage" or empty)
+        cap_code = "XXX"  # Fallback
+
+    # 3. Determine Colour Code
+    normalized_colour_key = (colour if colour else "").strip()
+    col_code = "XX"  # Default fallback
+    # Case-insensitive lookup for colour
+    for map_key, map_val in colour_code_map.items():
+        if map_key.lower() == normalized_colour_key.lower():
+            col_code = map_val
+            break
+
+    # 4. Determine Grade Code
+    normalized_grade_key = (grade if grade else "").strip()
+    grd_code = "XX"  # Default fallback
+    # Case-insensitive lookup for grade
+    for map_key, map_val in grade_code_map.items():
+        if map_key.lower() == normalized_grade_key.lower():  # Compare normalized keys
+            grd_code = map_val
+            break
+
+    # 5. Assemble SKU with Padding
+    prefix = "M-"
+
+    model_code_segment = prefix + raw_model_code.upper()
+    suffix_segment = cap_code.upper() + col_code.upper() + grd_code.upper()
+
+    padding_len = 15 - (len(model_code_segment) + len(suffix_segment))
+
+    padding_segment = ""
+    if padding_len > 0:
+        padding_segment = "X" * padding_len
+    elif padding_len < 0:
+        # Components are too long, truncate raw_model_code.
+        max_raw_model_len = 15 - len(prefix) - len(suffix_segment)
+        if max_raw_model_len < 0:
+            max_raw_model_len = 0
+
+        if len(raw_model_code) > max_raw_model_len:
+            raw_model_code = raw_model_code[:max_raw_model_len]
+
+        model_code_segment = prefix + raw_model_code.upper()
+        padding_len = 15 - (len(model_code_segment) + len(suffix_segment))
+        padding_segment = "X" * padding_len if padding_len > 0 else ""
+
+    final_sku = model_code_segment + padding_segment + suffix_segment
+
+    if len(final_sku) > 15:
+        final_sku = final_sku[:15]
+    elif len(final_sku) < 15:
+        final_sku = final_sku.ljust(15, "X")
+
+    return final_sku.upper()
+
+
+class SkuEngine:
+    """
+    SKU generator built once per model-code table. The colour, grade and model
+    lookups are lowercase-keyed dicts, so each row costs a handful of hash
+    lookups instead of scanning every map and the whole lookup table.
+    Output is identical to ``generate_sku``.
+    """
+
+    def __init__(
+        self,
+        model_codes: list,
+        colour_map: Optional[dict] = None,
+        grade_map: Optional[dict] = None,
+    ):
+        self.model_index: dict[tuple[str, str], str] = {}
+        for line in model_codes:
+            if len(line) < 3:
+                continue
+            # first match wins, as in get_model_code
+            self.model_index.setdefault((line[0].lower(), line[1].lower()), line[2])
+
+        # merge target for generate_frame, built once per table
+        self._lookup_frame = pd.DataFrame(
+            [(make, model, code) for (make, model), code in self.model_index.items()],
+            columns=["make_key", "model_key", "model_code"],
+        )
+
+        self.colour_index = self._lowercase_index(colour_map or sku_colour_map())
+        self.grade_index = self._lowercase_index(grade_map or sku_grade_map())
+        # bounded, because the engine lives as long as the lookup table version
+        self._generate_cached = lru_cache(maxsize=SKU_CACHE_SIZE)(self._generate)
+
+    @staticmethod
+    def _lowercase_index(code_map: dict) -> dict[str, str]:
+        index = {}
+        for key, code in code_map.items():
+            index.setdefault(key.lower(), code)
+        return index
+
+    def model_code(self, make: Optional[str], model_name: Optional[str]) -> str:
+        return self.model_index.get(
+            ((make or "").lower(), (model_name or "").lower()), UNKNOWN_MODEL_CODE
+        )
+
+    @staticmethod
+    def capacity_code(storage_capacity) -> str:
+        storage = str(storage_capacity if storage_capacity else "").upper()
+        if "TB" in storage:
+            num_match = _CAPACITY_DIGITS.search(storage)
+            return num_match.group(1) if num_match else "X"
+        if "GB" in storage:
+            num_match = _CAPACITY_DIGITS.search(storage)
+            return num_match.group(1) if num_match else "XXX"
+        return "XXX"
+
+    def colour_code(self, colour: Optional[str]) -> str:
+        return self.colour_index.get((colour or "").strip().lower(), "XX")
+
+    def grade_code(self, grade: Optional[str]) -> str:
+        return self.grade_index.get((grade or "").strip().lower(), "XX")
+
+    @staticmethod
+    def assemble(raw_model_code: str, cap_code: str, col_code: str, grd_code: str) -> str:
+        """Pads or truncates the model code so the SKU is exactly SKU_LENGTH characters."""
+        suffix_segment = cap_code.upper() + col_code.upper() + grd_code.upper()
+        model_code_segment = SKU_PREFIX + raw_model_code.upper()
+
+        if len(model_code_segment) + len(suffix_segment) > SKU_LENGTH:
+            max_raw_model_len = max(SKU_LENGTH - len(SKU_PREFIX) - len(suffix_segment), 0)
+            model_code_segment = SKU_PREFIX + raw_model_code[:max_raw_model_len].upper()
+
+        padding_len = SKU_LENGTH - (len(model_code_segment) + len(suffix_segment))
+        padding_segment = "X" * padding_len if padding_len > 0 else ""
+
+        final_sku = (model_code_segment + padding_segment + suffix_segment)[:SKU_LENGTH]
+        return final_sku.ljust(SKU_LENGTH, "X").upper()
+
+    def generate(
+        self,
+        make: Optional[str],
+        model_name: Optional[str],
+        storage_capacity,
+        colour: Optional[str],
+        grade: Optional[str],
+    ) -> str:
+        return self._generate_cached(make, model_name, storage_capacity, colour, grade)
+
+    def _generate(self, make, model_name, storage_capacity, colour, grade) -> str:
+        return self.assemble(
+            self.model_code(make, model_name),
+            self.capacity_code(storage_capacity),
+            self.colour_code(colour),
+            self.grade_code(grade),
+        )
+
+    def generate_many(self, rows: Iterable[dict]) -> list[str]:
+        """Generates a SKU for each device row (keys as in raw_product_scrapes)."""
+        generate = self.generate
+        return [
+            generate(
+                row.get("make"),
+                row.get("model"),
+                row.get("storage_capacity"),
+                row.get("colour"),
+                row.get("grade"),
+            )
+            for row in rows
+        ]
+
+    def generate_frame(self, devices: pd.DataFrame) -> pd.Series:
+        """
+        Vectorized ``generate`` over a DataFrame with make, model,
+        storage_capacity, colour and grade columns. The model code comes from a
+        merge against the lookup table and every other segment from column-wise
+        ``str`` operations, giving the same SKUs as the per-row path.
+
+        Suited to frames that are not already row dicts; for export pages the
+        memoized ``generate_many`` is faster (see scripts/benchmark_sku.py).
+        """
+        def text(column: str) -> pd.Series:
+            return devices[column].fillna("").astype(str)
+
+        keys = pd.DataFrame(
+            {"make_key": text("make").str.lower(), "model_key": text("model").str.lower()}
+        )
+        raw_model_code = (
+            keys.merge(self._lookup_frame, on=["make_key", "model_key"], how="left")["model_code"]
+            .fillna(UNKNOWN_MODEL_CODE)
+            .set_axis(devices.index)
+        )
+
+        storage = text("storage_capacity").str.upper()
+        digits = storage.str.extract(r"(\d+)", expand=False)
+        cap_code = pd.Series("XXX", index=devices.index)
+        cap_code = cap_code.mask(storage.str.contains("GB", regex=False), digits.fillna("XXX"))
+        cap_code = cap_code.mask(storage.str.contains("TB", regex=False), digits.fillna("X"))
+
+        col_code = text("colour").str.strip().str.lower().map(self.colour_index).fillna("XX")
+        grd_code = text("grade").str.strip().str.lower().map(self.grade_index).fillna("XX")
+
+        suffix = (cap_code + col_code + grd_code).str.upper()
+        widths = SKU_LENGTH - suffix.str.len()
+        model_upper = raw_model_code.str.upper()
+
+        # the space left for "M-" + model code depends only on the suffix
+        # length, so pad/truncate one group of equal widths at a time
+        model_segment = pd.Series("", index=devices.index)
+        for width in widths.unique():
+            rows = widths == width
+            max_raw_len = max(int(width) - len(SKU_PREFIX), 0)
+            fits = model_upper[rows].str.len() <= max_raw_len
+            raw = model_upper[rows].where(
+                fits, raw_model_code[rows].str.slice(0, max_raw_len).str.upper()
+            )
+            model_segment[rows] = (SKU_PREFIX + raw).str.pad(
+                int(width), side="right", fillchar="X"
+            )
+
+        return (
+            (model_segment + suffix)
+            .str.slice(0, SKU_LENGTH)
+            .str.pad(SKU_LENGTH, side="right", fillchar="X")
+            .str.upper()
+        )
@@ -0,0 +1,20 @@
+import os
+
+# main.py reads its settings at import time; the tests never reach these services
+for name in [
+    "SUPABASE_URL",
+    "SUPABASE_SERVICE_ROLE_KEY",
+    "FOXWAY_SUPABASE_ID",
+    "FOXWAY_API_KEY",
+    "KOMSA_URL",
+    "KOMSA_SUPABASE_ID",
+    "DIPLI_RECYCLE_API_KEY",
+    "DIPLI_RECYCLE_URL",
+    "DIPLI_RECYCLE_SUPABASE_ID",
+    "COMPA_URL",
+    "COMPA_PUBLIC_KEY",
+    "COMPA_PRIVATE_KEY",
+    "COMPA_SUPABASE_ID",
+    "GEMINI_API_KEY",
+]:
+    os.environ.setdefault(name, f"http://test.invalid/{name.lower()}")
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from exports import (
+    EXPORT_COLUMNS,
+    ExportCache,
+    combined_key,
+    devices_table,
+    render_devices_csv,
+    write_combined,
+)
+from sku import SkuEngine
+
+
+ENGINE = SkuEngine([["make", "model", "code"], ["Apple", "iPhone 13", "IP13"]])
+DEVICES = [
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "128GB", "grade": "A", "purchase_price": "300.50", "stock_count": 2, "colour": "Black", "ce_mark": None, "partial_vat": False},
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "1TB", "grade": "B", "purchase_price": 250, "stock_count": None, "colour": "Gold", "ce_mark": True, "partial_vat": True},
+]
+
+
+def test_devices_table_has_typed_columns_and_skus():
+    table = devices_table(DEVICES, ENGINE)
+    assert table.column_names == EXPORT_COLUMNS
+    assert table["purchase_price"].to_pylist() == [300.5, 250.0]
+    assert table["stock_count"].to_pylist() == [2, None]
+    assert table["SKU"].to_pylist() == ENGINE.generate_many(DEVICES)
+
+
+def test_exports_are_built_once_per_key(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    builds = []
+
+    async def load():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return DEVICES
+
+    async def run():
+        paths = await asyncio.gather(*(cache.get("run", "v1", "parquet", load, ENGINE) for _ in range(3)))
+        arrow = await cache.get("run", "v1", "arrow", load, ENGINE)
+        csv = await cache.get("run", "v1", "csv", load, ENGINE)
+        again = await cache.get("run", "v1", "parquet", load, ENGINE)
+        return paths, arrow, csv, again
+
+    paths, arrow, csv, again = asyncio.run(run())
+    assert len(builds) == 3 and len(set(paths)) == 1 and again == paths[0]
+    assert pq.read_table(paths[0]).equals(devices_table(DEVICES, ENGINE))
+    with pa.ipc.open_stream(arrow) as reader:
+        assert reader.read_all().num_rows == 2
+    assert csv.read_bytes() == render_devices_csv(DEVICES, ENGINE).encode()
+    assert cache.lookup("run", "v2", "csv") is None
+    assert ExportCache.etag("run", "v1", "csv") != ExportCache.etag("run", "v2", "csv")
+
+
+def test_streamed_export_only_joins_the_cache_on_commit(tmp_path):
+    cache = ExportCache(str(tmp_path))
+    aborted = cache.open_for_write("run", "v1", "csv")
+    aborted.write("partial")
+    aborted.abort()
+    assert list(tmp_path.iterdir()) == []
+
+    pending = cache.open_for_write("run", "v1", "csv")
+    pending.write("a,b\r\n")
+    assert cache.lookup("run", "v1", "csv") is None
+    pending.commit()
+    assert cache.lookup("run", "v1", "csv").read_bytes() == b"a,b\r\n"
+
+
+def test_least_recently_used_exports_are_evicted_past_the_budget(tmp_path):
+    cache = ExportCache(str(tmp_path), max_bytes=25)
+    for index, name in enumerate(["a", "b", "c"]):
+        pending = cache.open_for_write(name, "v1", "csv")
+        pending.write("x" * 10)
+        pending.commit()
+        os.utime(cache.export_path(name, "v1", "csv"), (index, index))
+        if name == "b":
+            # a hit makes "a" the most recently used
+            assert cache.lookup("a", "v1", "csv") is not None
+
+    assert cache.lookup("b", "v1", "csv") is None
+    assert cache.lookup("a", "v1", "csv") is not None
+    assert cache.lookup("c", "v1", "csv") is not None
+
+    # the order survives a restart through the files' mtimes
+    os.utime(cache.export_path("c", "v1", "csv"), (1, 1))
+    restarted = ExportCache(str(tmp_path), max_bytes=25)
+    pending = restarted.open_for_write("d", "v1", "csv")
+    pending.write("x" * 10)
+    pending.commit()
+    assert restarted.lookup("c", "v1", "csv") is None
+    assert restarted.lookup("a", "v1", "csv") is not None
+
+
+def test_combined_export_adds_a_source_column(tmp_path):
+    cache = ExportCache(str(tmp_path))
+
+    async def load():
+        return DEVICES
+
+    async def parts(format):
+        fox = await cache.get("fox-run", "v1", format, load, ENGINE)
+        kom = await cache.get("kom-run", "v1", format, load, ENGINE)
+        return [("Foxway", fox), ("Komsa", kom)]
+
+    write_combined(asyncio.run(parts("csv")), tmp_path / "all.csv", "csv")
+    lines = (tmp_path / "all.csv").read_bytes().decode().split("\r\n")
+    assert lines[0] == "source," + ",".join(EXPORT_COLUMNS)
+    assert [line.split(",")[0] for line in lines[1:-1]] == ["Foxway", "Foxway", "Komsa", "Komsa"]
+    assert lines[1] == "Foxway," + render_devices_csv(DEVICES, ENGINE).split("\r\n")[1]
+
+    write_combined(asyncio.run(parts("parquet")), tmp_path / "all.parquet", "parquet")
+    table = pq.read_table(tmp_path / "all.parquet")
+    assert table.column_names == ["source", *EXPORT_COLUMNS]
+    assert table["source"].to_pylist() == ["Foxway", "Foxway", "Komsa", "Komsa"]
+
+    assert combined_key({"Foxway": "a", "Komsa": "b"}) == combined_key({"Komsa": "b", "Foxway": "a"})
+    assert combined_key({"Foxway": "a", "Komsa": "b"}) != combined_key({"Foxway": "a", "Komsa": "c"})
@@ -0,0 +1,38 @@
+from models import RawProductScrape, validate_scrape_rows
+
+
+def make_row(**overrides):
+    row = {
+        "source_id": "source",
+        "make": "Apple",
+        "model": "iPhone 13",
+        "storage_capacity": "128gb",
+        "grade": "A",
+        "colour": "Blue",
+        "ce_mark": None,
+        "partial_vat": False,
+        "purchase_price": "300.5",
+        "trade_in_price": None,
+        "stock_count": 2,
+        "payload_hash": "abc",
+        "scrape_instance": None,
+    }
+    row.update(overrides)
+    return row
+
+
+def test_batch_matches_per_row_model():
+    row = make_row()
+    [validated], rejected = validate_scrape_rows([row])
+    legacy = RawProductScrape(**row).model_dump()
+    legacy["storage_capacity"] = legacy["storage_capacity"].upper()
+    assert rejected == []
+    assert validated == legacy
+
+
+def test_invalid_rows_are_reported_by_position():
+    rows = [make_row(), make_row(purchase_price="n/a"), make_row(model=None), make_row(stock_count="3")]
+    valid, rejected = validate_scrape_rows(rows)
+    assert [row["stock_count"] for row in valid] == [2, 3]
+    assert [index for index, _ in rejected] == [1, 2]
+    assert rejected[0][1].startswith("purchase_price:")
@@ -0,0 +1,128 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import main
+from maps import komsa_colour_map, sku_colour_map
+from normalize import (
+    ColourMatcher,
+    UNKNOWN_STORAGE,
+    make_set,
+    split_product_name,
+    split_storage,
+    strip_makes,
+)
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(supplier):
+    return json.loads((FIXTURES / f"{supplier}.json").read_text())
+
+
+def assert_subset(row, expected):
+    assert {key: row[key] for key in expected} == expected
+
+
+@pytest.mark.parametrize(
+    "text, bare, expected",
+    [
+        ("iPhone 12 128GB", False, ("128GB", "iPhone 12")),
+        ("iPhone 12 128 GB Black", False, ("128GB", "iPhone 12 Black")),
+        ("Galaxy S21 8GB 256GB", False, ("256GB", "Galaxy S21")),
+        ("iPhone 15 Pro 1TB", False, ("1TB", "iPhone 15 Pro")),
+        ("iPhone 11 64Go", False, ("64GB", "iPhone 11")),
+        ("iPhone 12", False, (UNKNOWN_STORAGE, "iPhone 12")),
+        ("iPhone 12", True, (UNKNOWN_STORAGE, "iPhone 12")),
+        ("iPhone 11 64", True, ("64GB", "iPhone 11")),
+        ("Watch 2 to 4 days", False, (UNKNOWN_STORAGE, "Watch 2 to 4 days")),
+        ("Pad 3GB", False, (UNKNOWN_STORAGE, "Pad 3GB")),
+        (None, False, (UNKNOWN_STORAGE, "")),
+    ],
+)
+def test_split_storage(text, bare, expected):
+    assert split_storage(text, bare_numbers=bare) == expected
+
+
+def test_split_product_name_drops_storage_and_makes_in_one_pass():
+    assert split_product_name("Apple iPhone 12 128GB", make_set(["Apple"])) == ("128GB", "iPhone 12")
+    assert split_product_name("Google Pixel 7 128 GB", ["Google Pixel"]) == ("128GB", "7")
+    assert split_product_name("Galaxy S20 (Samsung) 64", ["samsung"], bare_numbers=True) == (
+        "64GB",
+        "Galaxy S20",
+    )
+
+
+def test_strip_makes_whole_words_any_case():
+    assert strip_makes("Apple iPhone 12 apple", ["Apple"]) == "iPhone 12"
+    assert strip_makes("Pineapple Phone", ["Apple"]) == "Pineapple Phone"
+    assert strip_makes("Galaxy S20", []) == "Galaxy S20"
+
+
+def test_colour_matcher_prefers_longest_whole_word():
+    matcher = ColourMatcher(komsa_colour_map())
+    assert matcher.split("iphone 14 space grau") == ("Grey", "iphone 14")
+    assert matcher.split("galaxy s23 titanium black") == ("black", "galaxy s23")
+    assert matcher.split("protect case") == ("Unknown", "protect case")
+    assert ColourMatcher(sku_colour_map()).split("Jet Black")[0] == "BK"
+
+
+def test_colour_matcher_leftmost_longest_independent_of_order():
+    colours = {"grau": "Grey", "space grau": "Space Grey", "blau": "Blue", "au": "Gold"}
+    for colour_map in (colours, dict(reversed(colours.items()))):
+        matcher = ColourMatcher(colour_map)
+        assert matcher.find("iPhone Space Grau blau") == ("Space Grey", 7, 17)
+        assert matcher.find("blau space grau") == ("Blue", 0, 4)
+        assert matcher.find("grauer ton") is None
+        assert matcher.find("x au") == ("Gold", 2, 4)
+
+
+@pytest.mark.parametrize("case", load_fixture("foxway"))
+def test_foxway_fixtures(case):
+    [row] = main.normalize_foxway_rows([case["item"]], "Apple", partial_vat=False)
+    assert_subset(row, case["expected"])
+
+
+@pytest.mark.parametrize("case", load_fixture("komsa"))
+def test_komsa_fixtures(case):
+    rows, rejected = main.normalize_komsa_frame(pd.DataFrame([case["item"]]))
+    assert rejected.empty
+    [row] = rows
+    assert_subset(row, case["expected"])
+
+
+def test_komsa_frame_rejects_and_cleans_columns():
+    frame = pd.DataFrame(
+        [
+            {"Description": "Apple iPhone 13 128GB blau", "stock_count": ">100", "purchase_price": 300, "grade": None},
+            {"Description": "Apple iPhone 13 128GB blau", "stock_count": 5.0, "purchase_price": "n/a", "grade": "Gut"},
+            {"Description": None, "stock_count": 1, "purchase_price": 10, "grade": "Gut"},
+            {"Description": "Apple iPhone 12 64GB rot", "stock_count": "", "purchase_price": 250.5, "grade": "Grade Gut"},
+        ]
+    )
+    rows, rejected = main.normalize_komsa_frame(frame, "instance")
+
+    assert [(row["model"], row["stock_count"], row["grade"]) for row in rows] == [
+        ("iphone 13", 100, ""),
+        ("iphone 12", 0, "Good"),
+    ]
+    assert all(type(row["stock_count"]) is int for row in rows)
+    assert rows[1]["purchase_price"] == 250.5 and rows[1]["scrape_instance"] == "instance"
+    assert list(rejected["reason"]) == ["missing or invalid purchase_price", "missing Description"]
+
+
+@pytest.mark.parametrize("case", load_fixture("dipli"))
+def test_dipli_fixtures(case):
+    [row] = main.normalize_dipli_rows([case["item"]])
+    assert_subset(row, case["expected"])
+
+
+@pytest.mark.parametrize("case", load_fixture("compa"))
+def test_compa_fixtures(case):
+    rows = list(main.normalize_compa_rows([case["item"]]))
+    assert len(rows) == len(case["expected"])
+    for row, expected in zip(rows, case["expected"]):
+        assert_subset(row, expected)
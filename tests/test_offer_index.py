@@ -0,0 +1,53 @@
+from offer_index import OfferIndex, SourceOffers, price_key
+from sku import SkuEngine
+
+
+ENGINE = SkuEngine([["make", "model", "code"], ["Apple", "iPhone 13", "IP13"]])
+
+
+def offer(price, stock=1, model="iPhone 13", grade="A"):
+    return {
+        "make": "Apple",
+        "model": model,
+        "storage_capacity": "128GB",
+        "grade": grade,
+        "colour": "Black",
+        "partial_vat": False,
+        "purchase_price": price,
+        "stock_count": stock,
+    }
+
+
+def build_index(rows_by_source, version=None):
+    index = OfferIndex()
+    index.version = version
+    for source, rows in rows_by_source.items():
+        run = {"scrape_instance": f"{source}-run", "finished_at": "2026-01-01"}
+        index._offers[source] = SourceOffers.build(source, run, rows, ENGINE)
+    return index
+
+
+def test_cheapest_in_stock_offer_across_sources():
+    index = build_index(
+        {
+            "Foxway": [offer(310), offer(250, stock=0)],
+            "Komsa": [offer(280), offer(None)],
+            "Dipli": [offer(100, grade="C")],
+        }
+    )
+    sku = ENGINE.generate("Apple", "iPhone 13", "128GB", "Black", "A")
+
+    best, sources = index.best(sku)
+    assert (best["source"], best["purchase_price"], sources) == ("Komsa", 280.0, 2)
+
+    best, _ = index.best(sku, in_stock=False)
+    assert (best["source"], best["purchase_price"]) == ("Foxway", 250.0)
+
+    assert index.best("M-NOTASKU") == (None, 0)
+
+
+def test_key_query_ignores_other_models_sharing_an_unknown_sku():
+    index = build_index({"Foxway": [offer(90, model="Pixel 7"), offer(120, model="Pixel 8")]})
+    sku = ENGINE.generate("Apple", "Pixel 8", "128GB", "Black", "A")
+    best, _ = index.best(sku, price_key("apple", "pixel 8", "128gb", "a", "black"))
+    assert best["model"] == "Pixel 8"
@@ -0,0 +1,64 @@
+import asyncio
+
+import pandas as pd
+
+import price_history
+from price_history import PriceArchive, PriceHistory, daily_stats, offer_frame, rollup_rows, scrape_day
+
+
+def offers(*prices, sku="M-IP13XXX128BKAX"):
+    return [{"sku": sku, "purchase_price": price, "stock_count": 1} for price in prices]
+
+
+def test_scrape_day_is_utc():
+    assert scrape_day("2026-03-01T23:30:00-02:00") == "2026-03-02"
+    assert scrape_day("2026-03-01T10:00:00+00:00") == "2026-03-01"
+
+
+def test_rollup_rows_per_sku():
+    frame = offer_frame(offers(100, 300, 200) + offers(50, sku="M-OTHER"))
+    rows = {row["sku"]: row for row in rollup_rows(frame, "2026-03-01", "fox", "run")}
+    assert rows["M-IP13XXX128BKAX"]["median_price"] == 200
+    assert (rows["M-IP13XXX128BKAX"]["offers"], rows["M-IP13XXX128BKAX"]["stock_count"]) == (3, 3)
+    assert rows["M-OTHER"]["min_price"] == rows["M-OTHER"]["max_price"] == 50
+
+
+def test_archive_round_trip_and_daily_stats(tmp_path):
+    archive = PriceArchive(str(tmp_path))
+    archive.write(offer_frame(offers(100, 300)), "2026-03-01", "fox")
+    archive.write(offer_frame(offers(200)), "2026-03-01", "kom")
+    archive.write(offer_frame(offers(150)), "2026-03-02", "fox")
+    archive.write(offer_frame(offers(999)), "2026-04-01", "fox")
+    # a later scrape on the same day replaces the earlier one
+    archive.write(offer_frame(offers(120)), "2026-03-02", "fox")
+
+    stats = daily_stats(archive.read("M-IP13XXX128BKAX", "2026-03-01", "2026-03-31"))
+    assert [(d["day"], d["min"], d["median"], d["max"], d["sources"]) for d in stats] == [
+        ("2026-03-01", 100, 200, 300, 2),
+        ("2026-03-02", 120, 120, 120, 1),
+    ]
+    assert archive.read("M-IP13XXX128BKAX", "2026-03-01", "2026-03-31", "kom")["purchase_price"].tolist() == [200]
+
+
+def test_daily_falls_back_to_rollups_for_days_missing_from_the_archive(tmp_path, monkeypatch):
+    archive = PriceArchive(str(tmp_path))
+    archive.write(offer_frame(offers(100, 300)), "2026-03-02", "fox")
+    rollups = {
+        "fox": [
+            {"day": "2026-03-01", "source_id": "fox", "min_price": 90, "median_price": 95, "max_price": 99, "offers": 2},
+            {"day": "2026-03-02", "source_id": "fox", "min_price": 100, "median_price": 200, "max_price": 300, "offers": 2},
+        ],
+        "kom": [
+            {"day": "2026-03-01", "source_id": "kom", "min_price": 80, "median_price": 85, "max_price": 89, "offers": 1},
+        ],
+    }
+
+    async def select(table, columns, filters, between):
+        return rollups[filters["source_id"]]
+
+    monkeypatch.setattr(price_history.db, "select", select)
+    days = asyncio.run(PriceHistory(archive).daily("M-IP13XXX128BKAX", "2026-03-01", "2026-03-31", ["fox", "kom"]))
+    assert [(d["day"], d["min"], d["median"], d["max"]) for d in days] == [
+        ("2026-03-01", 80, 90, 99),
+        ("2026-03-02", 100, 200, 300),
+    ]
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from sku import SKU_LENGTH, SkuEngine, generate_sku
+
+
+MODEL_CODES = [
+    ["make", "model", "code"],
+    ["Apple", "iPhone 13", "IP13"],
+    ["Apple", "iPhone 13", "DUPLICATE"],  # first match wins
+    ["Samsung", "Galaxy S21 Ultra", "GALAXYS21ULTRA"],  # long enough to be truncated
+    ["short"],
+]
+
+DEVICES = [
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "128GB", "colour": "Black", "grade": "A"},
+    {"make": "apple", "model": "IPHONE 13", "storage_capacity": "256gb", "colour": "  space grey ", "grade": "a+"},
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "1TB", "colour": "Gold", "grade": "B"},
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "TB", "colour": "Gold", "grade": "B"},
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": "GB", "colour": "Gold", "grade": "B"},
+    {"make": "Samsung", "model": "Galaxy S21 Ultra", "storage_capacity": "512GB", "colour": "Icelandic Illusion", "grade": "BC"},
+    {"make": "Samsung", "model": "Galaxy S21 Ultra", "storage_capacity": "2TB", "colour": "Unknown", "grade": "Excellent"},
+    {"make": "Huawei", "model": "Not In Sheet", "storage_capacity": "Unknown Storage", "colour": "Blue", "grade": "C"},
+    {"make": None, "model": None, "storage_capacity": None, "colour": None, "grade": None},
+    {"make": "Apple", "model": "iPhone 13", "storage_capacity": None, "colour": None, "grade": "A"},
+]
+
+
+def expected_skus():
+    return [
+        generate_sku(
+            d["make"], d["model"], d["storage_capacity"], d["colour"], d["grade"], MODEL_CODES
+        )
+        for d in DEVICES
+    ]
+
+
+@pytest.fixture
+def engine():
+    return SkuEngine(MODEL_CODES)
+
+
+def test_generate_many_matches_generate_sku(engine):
+    assert engine.generate_many(DEVICES) == expected_skus()
+
+
+def test_generate_frame_matches_generate_sku(engine):
+    frame = pd.DataFrame(DEVICES, dtype=object)
+    assert engine.generate_frame(frame).tolist() == expected_skus()
+
+
+def test_generate_frame_keeps_index(engine):
+    frame = pd.DataFrame(DEVICES, dtype=object, index=range(100, 100 + len(DEVICES)))
+    assert engine.generate_frame(frame).tolist() == expected_skus()
+
+
+def test_skus_are_fixed_length_and_truncated(engine):
+    skus = engine.generate_many(DEVICES)
+    assert all(len(sku) == SKU_LENGTH for sku in skus)
+    # "M-" + GALAXYS21ULTRA does not fit alongside a 512/IL/CX suffix
+    assert skus[5] == "M-GALAXY512ILCX"
+    assert skus[8] == "M-XXXXXXXXXXXXX"
@@ -0,0 +1,38 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+import pandas as pd
+
+from config import get_settings
+
+
+settings = get_settings()
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Worker processes for CPU-heavy parsing that would otherwise stall the event loop."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.PARSE_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_pool = None
+
+
+async def run_in_process_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def parse_excel_bytes(content: bytes) -> pd.DataFrame:
+    """Parses the first sheet of an .xlsx payload. Runs inside a worker process."""
+    return pd.read_excel(BytesIO(content), engine="openpyxl")